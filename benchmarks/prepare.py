@@ -0,0 +1,30 @@
+"""Times the stages between VGM events and pattern rows: chip states at
+every row (tabulate and interpolate, or sample) and `prepare` of FM and PSG.
+
+usage: python benchmarks/prepare.py song.vgm [row duration]"""
+import sys
+import time
+from vgm2fur import vgm, transform
+
+def main():
+    song = vgm.load(sys.argv[1])
+    period = float(sys.argv[2]) if len(sys.argv) > 2 else 735
+    chiplist = ['ym2612', 'sn76489', 'dac', 'data']
+    t0 = time.perf_counter()
+    if hasattr(transform, 'sample'):
+        rows, _ = transform.sample(song.events, chips=chiplist, length=song.total_wait,
+            period=period)
+        fm, psg, dac = (list(column) for column in zip(*rows))
+    else:
+        tables, _ = transform.tabulate(song.events, chips=chiplist)
+        fm, psg, dac = transform.interpolate(tables, length=song.total_wait, period=period, skip=0)
+    t1 = time.perf_counter()
+    transform.psg.prepare(psg)
+    t2 = time.perf_counter()
+    transform.fm.prepare(fm)
+    t3 = time.perf_counter()
+    print(f'rows {len(fm)}: states {t1 - t0:.2f}s, psg.prepare {t2 - t1:.2f}s, '
+        f'fm.prepare {t3 - t2:.2f}s')
+
+if __name__ == '__main__':
+    main()
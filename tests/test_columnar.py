@@ -0,0 +1,19 @@
+from vgm2fur import vgm
+import vgmfile
+
+def _song():
+    body = (vgmfile.datablock(bytes(40)) + vgmfile.fm(0, 0x28, 0xF0) + vgmfile.psg(0x9F)
+        + vgmfile.wait(100) + vgmfile.pointer(8) + vgmfile.dac(3) + vgmfile.fm(1, 0xB4, 0xC0)
+        + b'\x4F\x12' + vgmfile.datablock(bytes(5)) + vgmfile.psg(0x90) + vgmfile.wait(7))
+    return vgm.Song(vgmfile.build(body, total=110))
+
+def test_filtered_columns_are_rows_of_unfiltered_ones():
+    song = _song()
+    full = vgm.decode_columnar(song)
+    for chips in (['ym2612'], ['sn76489'], ['dac', 'data'], ['data']):
+        cols = vgm.decode_columnar(song, *chips)
+        comset = vgm.song._chip_comset(chips)
+        kept = [i for i, com in enumerate(full.com) if com in comset]
+        for name, col in zip(cols._fields, cols):
+            assert list(col) == [getattr(full, name)[i] for i in kept], (chips, name)
+        assert len(cols.com) < len(full.com)
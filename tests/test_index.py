@@ -0,0 +1,40 @@
+import os
+import subprocess
+import sys
+from vgm2fur import vgm, transform
+import vgmfile
+
+_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def _psg_song():
+    body = bytearray()
+    for i in range(400):
+        body += vgmfile.psg(0x90 | (i % 3) << 5 | i % 16)
+        body += vgmfile.wait(5000)
+    return vgmfile.build(bytes(body), total=400 * 5000)
+
+def _print_istate(path, *args):
+    env = dict(os.environ, PYTHONPATH=_ROOT)
+    res = subprocess.run([sys.executable, '-m', 'vgm2fur', path, '--print-istate=psgx,vol',
+        '--unsampled', *args], env=env, capture_output=True, text=True, check=True)
+    return res.stdout
+
+def test_unsampled_output_does_not_depend_on_index_file(tmp_path):
+    path = tmp_path / 'song.vgm'
+    path.write_bytes(_psg_song())
+    expected = _print_istate(path, '--end-samples=100000')
+    first = _print_istate(path, '--index', '--end-samples=100000')
+    assert os.path.exists(f'{path}.idx')
+    second = _print_istate(path, '--index', '--end-samples=100000')
+    assert first == expected
+    assert second == expected
+    assert len(expected.splitlines()) == 1 + 100000 // 5000
+
+def test_tabulate_fills_index_past_end():
+    song = vgm.Song(_psg_song())
+    expected, _ = transform.tabulate(song.cursor, chips=['sn76489'], end=100000)
+    index = transform.Index()
+    tables, _ = transform.tabulate(song.cursor, chips=['sn76489'], end=100000, index=index)
+    assert tables == expected
+    assert index.complete
+    assert index.keyframes[-1].t > 100000
@@ -0,0 +1,29 @@
+from vgm2fur import chips, vgm, transform
+from vgm2fur.transform import ir
+import vgmfile
+
+def test_repeated_ill_formed_writes_are_all_reported():
+    writes = [(0, 0x28, 0x03)] * 3 + [(0, 0x28, 0xF1)] * 2 + [(0, 0x33, 0x10)] * 3
+    body = b''.join(vgmfile.fm(*write) + vgmfile.wait(10) for write in writes)
+    song = vgm.Song(vgmfile.build(body, total=80))
+
+    expected = []
+    fm = chips.YM2612()
+    for port, addr, data in writes:
+        try:
+            fm.update(port, addr, data)
+        except chips.ym2612.IllFormedEvent as err:
+            expected.append(str(err))
+
+    diagnostics = []
+    rows, _ = transform.changes(song.events, chips=['ym2612'], diagnostics=diagnostics)
+    list(rows)
+    assert [str(err) for err in diagnostics] == expected
+    assert len(expected) == 6
+
+def test_repeated_key_on_writes_are_dropped():
+    body = (vgmfile.fm(0, 0x28, 0xF1) + vgmfile.wait(10)) * 3
+    song = vgm.Song(vgmfile.build(body, total=30))
+    fm = [a for stream in ir.normalize(song.events('ym2612'))
+        for kind, a, b in stream if kind == ir.FM]
+    assert fm == [0x28]
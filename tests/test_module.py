@@ -0,0 +1,42 @@
+from vgm2fur import furnace
+from vgm2fur.furnace import effects
+
+CHANNELS = ['psg1', 'psg2', 'psg3', 'noise', 'fm1', 'fm2', 'fm3', 'fm4', 'fm5', 'fm6']
+JUMP = bytes([0x0B, 0, 0x0D, 5])
+
+def _entries(rows, fx, last_fx):
+    return [furnace.Entry(fx=fx)] * (rows - 1) + [furnace.Entry(fx=last_fx)]
+
+def _jumps(fur):
+    return [i for i, patterns in enumerate(fur.pattern_matrix) if any(JUMP in p for p in patterns)]
+
+def _module(channels):
+    fur = furnace.Module()
+    fur.pattern_length = 16
+    fur.loop_back(5)
+    for name, entries in channels.items():
+        fur.add_patterns(entries, name)
+    fur.prebuild()
+    return fur
+
+def test_jump_skips_occupied_channels():
+    busy = [effects.noise_mode(1), effects.pitch_up(3)]
+    channels = {name: _entries(40, busy, busy) for name in CHANNELS}
+    # fm2 has three effect columns, of which its last row uses one
+    channels['fm2'] = _entries(40, busy + [effects.lfo(1)], [effects.pan(0x11)])
+    fur = _module(channels)
+    assert _jumps(fur) == [1]
+    assert fur.effects_count == [2, 3, 2, 2, 2, 2, 2, 2, 2, 2]
+
+def test_jump_takes_last_channel_when_all_occupied():
+    busy = [effects.noise_mode(1)]
+    fur = _module({name: _entries(40, busy, busy) for name in CHANNELS})
+    # fm6 is added last
+    assert _jumps(fur) == [5]
+    assert fur.effects_count[5] == 3
+
+def test_jump_without_noise_channel():
+    busy = [effects.noise_mode(1)]
+    fur = _module({name: _entries(40, busy, busy) for name in CHANNELS if name != 'noise'})
+    assert _jumps(fur) == [9]
+    assert fur.effects_count[9] == 2
@@ -0,0 +1,44 @@
+import random
+from vgm2fur import chips, transform
+from vgm2fur.transform import to_patterns_fm, to_patterns_psg
+
+def _psg_states(seed):
+    rng = random.Random(seed)
+    chip = chips.SN76489()
+    states = []
+    for _ in range(2000):
+        if rng.random() < 0.5:
+            chip.update(0x80 | rng.randrange(3) << 5 | rng.randrange(16))
+            chip.update(rng.randrange(64))
+        else:
+            chip.update(0x90 | rng.randrange(4) << 5 | rng.randrange(16))
+        states.append(chip.copy())
+    return states
+
+def test_psg_prepare_matches_per_row_notes():
+    states = _psg_states(0)
+    psg1, psg2, psg3, noise = transform.psg.prepare(states)
+    for state, r1, r2, r3, rn in zip(states, psg1, psg2, psg3, noise):
+        notes = [to_patterns_psg._find_best_note(state.tonal[i].freq) for i in range(3)]
+        assert (r1, r2, r3) == tuple((*notes[i], state.tonal[i].vol) for i in range(3))
+        assert rn == (*notes[2], state.noise.vol, state.noise.mode)
+
+def test_fm_prepare_matches_per_row_channels():
+    rng = random.Random(1)
+    chip = chips.YM2612()
+    states = []
+    for _ in range(1000):
+        for _ in range(rng.randrange(4)):
+            port = rng.randrange(2)
+            addr = rng.choice([0x30, 0x44, 0x4C, 0x50, 0x60, 0xA0, 0xA4, 0xB0, 0xB4])
+            chip.update(port, addr + rng.randrange(3), rng.randrange(256) & 0x3F)
+        chip.update(0, 0x28, rng.choice([0x00, 0xF0, 0xF1, 0xF5, 0x06]))
+        state = chip.copy()
+        # rows share a state until it changes
+        states.extend([state] * rng.randrange(1, 4))
+    fm = transform.fm.prepare(states)
+    funcs = (to_patterns_fm._to_key_voice_lfo, to_patterns_fm._to_key_voice,
+        to_patterns_fm._to_key_voice, to_patterns_fm._to_key_voice,
+        to_patterns_fm._to_key_voice, to_patterns_fm._to_key_voice_dac)
+    for num, (func, channel) in enumerate(zip(funcs, fm)):
+        assert channel == [func(state.channels[num]) for state in states]
@@ -0,0 +1,24 @@
+from vgm2fur import vgm, transform
+import vgmfile
+
+def _tail_song():
+    # the sample keeps playing after the last row, then another data block follows
+    body = (vgmfile.datablock(bytes(300)) + vgmfile.pointer(0) + vgmfile.dac(1) * 250
+        + vgmfile.datablock(bytes(10)))
+    return vgm.Song(vgmfile.build(body, total=250))
+
+def test_dac_sample_playing_past_last_row():
+    song = _tail_song()
+    rows, data = transform.sample(song.events, chips=['dac', 'data'], length=100, period=10)
+    rows = list(rows)
+    tables, _ = transform.tabulate(song.events, chips=['dac'])
+    (expected,) = transform.interpolate(tables, length=100, period=10, skip=0)
+    assert [row[0].length for row in rows] == [state.length for state in expected]
+    assert rows[-1][0].length == 250
+    assert len(data) == 2
+
+def test_dac_sample_past_end_of_table():
+    song = _tail_song()
+    (table,), data = transform.tabulate(song.events, chips=['dac', 'data'], end=100)
+    assert table[-1].chip.length == 250
+    assert len(data) == 2
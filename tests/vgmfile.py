@@ -0,0 +1,35 @@
+import struct
+
+def wait(samples):
+    return b'\x61' + struct.pack('<H', samples)
+
+def fm(port, addr, data):
+    return bytes([0x52 + port, addr, data])
+
+def psg(data):
+    return bytes([0x50, data])
+
+def pointer(ptr):
+    return b'\xE0' + struct.pack('<L', ptr)
+
+def dac(samples):
+    """YM2612 DAC write from the data bank followed by a wait of `samples`."""
+    return bytes([0x80 + samples])
+
+def datablock(data, type=0):
+    return b'\x67\x66' + struct.pack('<BL', type, len(data)) + data
+
+def build(body, *, total, loop=None, version=0x150):
+    """VGM file with commands `body` lasting `total` samples; `loop` is
+    `(offset in body, samples)`."""
+    header = bytearray(0x40)
+    header[0:4] = b'Vgm '
+    struct.pack_into('<L', header, 0x04, len(header) + len(body) + 1 - 0x04)
+    struct.pack_into('<L', header, 0x08, version)
+    struct.pack_into('<L', header, 0x18, total)
+    if loop is not None:
+        offset, samples = loop
+        struct.pack_into('<L', header, 0x1C, len(header) + offset - 0x1C)
+        struct.pack_into('<L', header, 0x20, samples)
+    struct.pack_into('<L', header, 0x34, len(header) - 0x34)
+    return bytes(header) + body + b'\x66'
@@ -1,3 +1,5 @@
+import collections
+
 def _order_bounds(a, b):
     return min(a, b), max(a, b)
 
@@ -74,3 +76,16 @@ def join(*args):
         n = (arg & 0xFF) << shift
         shift += 8
     return Bitfield(n)
+
+def compile(cls, /, *, width=8):
+    """Decodes every `width`-bit value with `cls`, a `Bitfield` subclass with
+    `named` fields, ahead of time. Returns a lookup table: a tuple, indexed
+    by value, of named tuples with the same fields."""
+    fields = {}
+    for klass in reversed(cls.__mro__):
+        for name, attr in vars(klass).items():
+            if isinstance(attr, named):
+                fields[name] = attr
+    T = collections.namedtuple(cls.__name__, fields)
+    return tuple(T(*(_get_field(value, f.mask, f.shift) for f in fields.values()))
+        for value in range(1 << width))
@@ -1,5 +1,9 @@
+import struct
 from vgm2fur import vgm
 
+# packed state: key id, start, length, duration, pause, idle
+_PACKED = struct.Struct('<5Q?')
+
 class Sampler:
     separation_margin = 512
     def __init__(self, /, *, noinit=False):
@@ -27,6 +31,11 @@ class Sampler:
     def rate(self):
         return vgm.SAMPLE_RATE * self.length // self.duration
 
+    @property
+    def generation(self):
+        # nothing but the sample id is compared
+        return self.keyid
+
     def __eq__(self, other):
         return self.keyid == other.keyid
 
@@ -66,6 +75,19 @@ class Sampler:
     def wait(self, duration):
         self.pause += duration
 
+    def play_run(self, waits):
+        """Same as `play` followed by `wait` for every duration in `waits`."""
+        if (self.length == 0 or self.pause > self.separation_margin
+                or max(waits) > self.separation_margin):
+            for duration in waits:
+                self.play()
+                self.wait(duration)
+            return
+        # no pause is long enough to split the sample
+        self.duration += self.pause + sum(waits) - waits[-1]
+        self.length += len(waits)
+        self.pause = waits[-1]
+
     def copy(self):
         clone = Sampler(noinit=True)
         clone.keyid = self.keyid
@@ -76,14 +98,41 @@ class Sampler:
         clone.idle = self.idle
         return clone
 
+    packed_size = _PACKED.size
+
+    def pack(self):
+        """Whole state as bytes, which `unpack` turns back into a model."""
+        return _PACKED.pack(self.keyid, self.start, self.length, self.duration,
+            self.pause, self.idle)
+
+    @classmethod
+    def unpack(cls, data):
+        chip = cls(noinit=True)
+        (chip.keyid, chip.start, length, duration,
+            chip.pause, chip.idle) = _PACKED.unpack(data)
+        chip._length = [length]
+        chip._duration = [duration]
+        return chip
+
 def csv(chip_states, features):
+    fts = _features(features)
+    if len(fts) == 0:
+        return None
+    return _csv(chip_states, fts)
+
+def _features(features):
     fts = []
     for ft in features:
         if ft in {'dacid', 'dacinfo'}:
             fts.append(ft)
-    if len(fts) == 0:
+    return fts
+
+def projection(features):
+    """Returns a function of a `Sampler` whose value changes whenever its
+    states are told apart, or None if `csv` prints nothing for `features`."""
+    if len(_features(features)) == 0:
         return None
-    return _csv(chip_states, fts)
+    return lambda chip: chip.keyid
 
 def _csv(chip_states, fts):
     elements = []
@@ -1,88 +1,128 @@
-from vgm2fur import bitfield
-import copy
+from vgm2fur import registers as regs
+from typing import NamedTuple
+import operator
+import struct
 
 
-class TonalChannel:
-    def __init__(self, noinit=False):
-        if noinit: return
-        self.freq = 0
-        self.vol = 15
+class TonalChannel(NamedTuple):
+    freq: int
+    vol: int
 
-    def copy(self):
-        clone = TonalChannel(noinit=True)
-        clone.freq = self.freq
-        clone.vol = self.vol
-        return clone
 
+class NoiseChannel(NamedTuple):
+    mode: int
+    vol: int
 
-class NoiseChannel:
-    def __init__(self, noinit=False):
-        if noinit: return
-        self.mode = 0
-        self.vol = 15
 
-    def copy(self):
-        clone = NoiseChannel(noinit=True)
-        clone.mode = self.mode
-        clone.vol = self.vol
-        return clone
+class State(NamedTuple):
+    """Immutable snapshot of the chip state."""
+    freq1: int
+    vol1: int
+    freq2: int
+    vol2: int
+    freq3: int
+    vol3: int
+    noise_mode: int
+    noise_vol: int
 
+    @property
+    def tonal(self):
+        return (TonalChannel(self[0], self[1]),
+            TonalChannel(self[2], self[3]),
+            TonalChannel(self[4], self[5]))
 
-class EventBF(bitfield.Bitfield):
-    is_action = bitfield.named[7]
-    channel = bitfield.named[6:5]
-    is_volume = bitfield.named[4]
-    payload_l = bitfield.named[3:0]
-    payload_h = bitfield.named[5:0]
+    @property
+    def noise(self):
+        return NoiseChannel(self[6], self[7])
+
+    def ch(self, chan_no):
+        match chan_no:
+            case 0 | 1 | 2: return self.tonal[chan_no]
+            case 3: return self.noise
+
+_INITIAL = State(0, 15, 0, 15, 0, 15, 0, 15)
+
+# packed state: fields, last latched field and frequency (-1 if none),
+# generation
+_PACKED = struct.Struct('<8H2hQ')
+
+# actions of written bytes
+_SET = 0     # set state field to value
+_LATCH = 1   # latch low frequency bits of a tonal channel
+_DATA = 2    # set high frequency bits of the latched channel
+
+def _make_write_table():
+    """Decodes every written byte into `(action, field, value)`; `field` is
+    an index in `State`, or a tonal channel for `_LATCH`."""
+    table = []
+    for event in regs.PSG_EVENT:
+        if not event.is_action:
+            table.append((_DATA, None, event.payload_h << 4))
+        elif event.is_volume:
+            table.append((_SET, 2 * event.channel + 1, event.payload_l))
+        elif event.channel != 3:
+            table.append((_LATCH, event.channel, event.payload_l))
+        else:
+            table.append((_SET, 6, event.payload_l))
+    return tuple(table)
+
+_WRITES = _make_write_table()
 
 
 class SN76489:
     def __init__(self, /, noinit=False):
         if noinit: return
-        self.tonal = [TonalChannel() for _ in range(3)]
-        self.noise = NoiseChannel()
+        self.fields = list(_INITIAL)
         self._lastch = None
         self._freq = None
-
-    def _tuple(self):
-        return (self.tonal[0].freq,
-            self.tonal[0].vol,
-            self.tonal[1].freq,
-            self.tonal[1].vol,
-            self.tonal[2].freq,
-            self.tonal[2].vol,
-            self.noise.mode,
-            self.noise.vol)
+        self.generation = 0  # incremented whenever the state changes
 
     def __eq__(self, other):
-        return self._tuple() == other._tuple()
-
-    def ch(self, chan_no):
-        match chan_no:
-            case 0 | 1 | 2: return self.tonal[chan_no]
-            case 3: return self.noise
+        return self.fields == other.fields
 
     def update(self, data):
-        data = EventBF(data)
-        if data.is_action:
-            if data.is_volume:
-                self.ch(data.channel).vol = data.payload_l
-            elif data.channel != 3:
-                self._freq = data.payload_l
-                self._lastch = data.channel
-            else:
-                self.noise.mode = data.payload_l
-        else:
-            self.tonal[self._lastch].freq = self._freq | (data.payload_h << 4)
+        action, field, value = _WRITES[data]
+        if action == _LATCH:
+            self._freq = value
+            self._lastch = field
+            return
+        if action == _DATA:
+            field = 2 * self._lastch
+            value |= self._freq
+        if self.fields[field] != value:
+            self.fields[field] = value
+            self.generation += 1
 
     def copy(self):
-        clone = SN76489(noinit=True)
-        clone.tonal = [ch.copy() for ch in self.tonal]
-        clone.noise = self.noise.copy()
-        return clone
+        """Snapshot of the state, as a `State`."""
+        return State._make(self.fields)
+
+    packed_size = _PACKED.size
+
+    def pack(self):
+        """Whole state as bytes, which `unpack` turns back into a model."""
+        lastch = -1 if self._lastch is None else self._lastch
+        freq = -1 if self._freq is None else self._freq
+        return _PACKED.pack(*self.fields, lastch, freq, self.generation)
+
+    @classmethod
+    def unpack(cls, data):
+        *fields, lastch, freq, generation = _PACKED.unpack(data)
+        chip = cls()
+        chip.fields = fields
+        chip._lastch = None if lastch < 0 else lastch
+        chip._freq = None if freq < 0 else freq
+        chip.generation = generation
+        return chip
 
 
 def csv(chip_states, src_features):
+    snft, toft, noft = _features(src_features)
+    if len(snft) == 0:
+        return None
+    return _csv(chip_states, snft, toft, noft)
+
+def _features(src_features):
     snft = []
     toft = []
     noft = []
@@ -101,9 +141,30 @@ def csv(chip_states, src_features):
                 toft.append(feature)
             case 'nmode':
                 noft.append(feature)
+    return snft, toft, noft
+
+def projection(src_features):
+    """Returns a function of a `SN76489` whose value changes whenever
+    anything `csv` prints for `src_features` does, or None if `csv` prints
+    nothing."""
+    snft, toft, noft = _features(src_features)
     if len(snft) == 0:
         return None
-    return _csv(chip_states, snft, toft, noft)
+    fields = set()
+    for ft in snft:
+        match ft:
+            case 'psg1' | 'psg2' | 'psg3':
+                ch = int(ft[3]) - 1
+                if 'vol' in toft: fields.add(2 * ch + 1)
+                if 'freqpsg' in toft: fields.add(2 * ch)
+            case 'noise':
+                if 'vol' in toft: fields.add(7)
+                if 'nmode' in noft: fields.add(6)
+    fields = sorted(fields)
+    if len(fields) == 0:
+        return lambda chip: ()
+    get = operator.itemgetter(*fields)
+    return lambda chip: get(chip.fields)
 
 def _csv(chip_states, snft, toft, noft):
     yield _csv_header(snft, toft, noft)
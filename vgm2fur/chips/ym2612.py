@@ -1,29 +1,32 @@
-from vgm2fur import bitfield
+from vgm2fur import registers as regs
+import array
 import copy
-import warnings
+import operator
+import struct
 
 
 class FreqLatch:
-    use = False
-    def __init__(self):
+    def __init__(self, use=False):
+        self.use = use
         self.state = 0
-        self.freq = bitfield.make(0)
+        self.freq = 0
         self.block = 0
     _low_table = [2, 0, 2]
-    def low(self, data: bitfield.Bitfield):
-        self.freq[7:0] = data[7:0]
-        if not FreqLatch.use: 
-            return (self.freq.all, self.block)
+    def low(self, data):
+        self.freq = (self.freq & 0x700) | data
+        if not self.use:
+            return (self.freq, self.block)
         self.state = FreqLatch._low_table[self.state]
-        return (self.freq.all, self.block) if self.state == 0 else None
+        return (self.freq, self.block) if self.state == 0 else None
     _high_table = [1, 1, 0]
-    def high(self, data: bitfield.Bitfield):
-        self.freq[10:8] = data[2:0]
-        self.block = data[5:3]
-        if not FreqLatch.use: 
-            return (self.freq.all, self.block)
+    def high(self, data):
+        reg = regs.BLOCK_FREQ[data]
+        self.freq = (self.freq & 0xFF) | (reg.freq << 8)
+        self.block = reg.block
+        if not self.use:
+            return (self.freq, self.block)
         self.state = FreqLatch._high_table[self.state]
-        return (self.freq.all, self.block) if self.state == 0 else None
+        return (self.freq, self.block) if self.state == 0 else None
 
 
 class IllFormedEvent(Exception):
@@ -42,293 +45,395 @@ class IllFormedEvent(Exception):
         return ' '.join(elems)
 
 
+# Decoded state of the chip is kept in one flat array of fields: six channel
+# blocks of `_CH_SIZE` fields, each holding its four operator blocks, then
+# the fields of the whole chip. Key ids are kept in an array of their own.
+
+# channel fields
+_OPMASK = 0
+_FREQ = 1
+_BLOCK = 2
+_ALG = 3
+_FB = 4
+_PMS = 5
+_AMS = 6
+_PAN = 7
+_OPS = 8
+
+# operator fields; frequency and block are only used by channel 3 operators
+_MULT = 0
+_DT = 1
+_TL = 2
+_AR = 3
+_RS = 4
+_DR = 5
+_AM = 6
+_SR = 7
+_RR = 8
+_SL = 9
+_SSG = 10
+_SSG_EN = 11
+_OP_FREQ = 12
+_OP_BLOCK = 13
+_OP_SIZE = 14
+
+_CH_SIZE = _OPS + 4 * _OP_SIZE
+
+# chip fields
+_LFO = 6 * _CH_SIZE
+_LFO_EN = _LFO + 1
+_MODE = _LFO + 2
+_DAC_EN = _LFO + 3
+_SIZE = _LFO + 4
+
+def _ch_base(ch):
+    return ch * _CH_SIZE
+
+def _op_base(ch, op):
+    return ch * _CH_SIZE + _OPS + op * _OP_SIZE
+
+# frequency latches: one per channel, then channel 3 operators 1 to 3
+_CH3_OP_LATCH = 6
+_LATCHES = 9
+
+# packed state: fields, key ids, registers, states, frequencies and blocks
+# of latches, generation, whether latching is on
+_PACKED = struct.Struct(f'<{_SIZE}h6Q{0xC0 * 2}s{_LATCHES}B{_LATCHES}H{_LATCHES}BQ?')
+
+
 class YM2612:
-    def __init__(self, /, *, noinit=False):
+    """YM2612 state model; `latch` turns on frequency latching."""
+    def __init__(self, /, *, latch=False, noinit=False):
+        self._channels = None
         if noinit: return
-        self.channels = [Channel1(), Channel(), Channel3(), Channel(), Channel(), Channel6()]
+        self.fields = array.array('h', [0]) * _SIZE
+        self.keyids = array.array('L', [0]) * 6
         self.regs = bytearray(0xC0 * 2)
+        self.latches = [FreqLatch(latch) for _ in range(_LATCHES)]
+        self.generation = 0  # incremented whenever the state changes
+
+    @property
+    def channels(self):
+        if self._channels is None:
+            self._channels = [channel(self, num) for num in range(6)]
+        return self._channels
 
     def ch(self, num):
         return self.channels[num - 1]
 
-    _op_map = [0, 2, 1, 3]
-    def _get_op(self, port, addr):
-        addr = bitfield.make(addr)
-        subch = addr[1:0]
-        if subch == 3:
-            raise IllFormedEvent((0x52 if port == 0 else 0x53, addr.all, None))
-        ch = subch + port * 3
-        op = YM2612._op_map[addr[3:2]]
-        return self.channels[ch].operators[op]
-
-    def _get_ch(self, port, addr):
-        addr = bitfield.make(addr)
-        subch = addr[1:0]
-        if subch == 3:
-            raise IllFormedEvent((0x52 if port == 0 else 0x53, addr.all, None))
-        ch = subch + port * 3
-        return self.channels[ch]
-
-    _ch3_op_map = [2, 0, 1]
-    def _get_ch3_op(self, addr):
-        addr = bitfield.make(addr)
-        index = addr[1:0]
-        if index == 3:
-            raise IllFormedEvent((0x52, addr.all, None))
-        op = YM2612._ch3_op_map[index]
-        return self.channels[2].operators[op]
+    @property
+    def ch3_mode(self):
+        return self.fields[_MODE]
 
     def __eq__(self, other):
-        return (
-            bytes(self.regs) == bytes(other.regs) and 
-            all(a.keyid == b.keyid for (a, b) in zip(self.channels, other.channels)))
+        return self.fields == other.fields and self.keyids == other.keyids
 
     def update(self, port, addr, data):
-        self.regs[port * 0xC0 + addr] = data
-        data = bitfield.make(data)
-        try:
-            match (port, addr):
-                case (0, 0x22):
-                    self.ch(1).lfo = data[2:0]
-                    self.ch(1).lfo_en = data[3]
-                case (0, 0x27):
-                    self.ch(3).mode = data[7:6]
-                case (0, 0x28):
-                    subch = data[1:0]
-                    if subch == 3:
-                        raise IllFormedEvent((0x52, 0x28, data.all))
-                    ch = self.channels[subch + 3 * data[2]]
-                    opmask = data[7:4]
-                    if ch.opmask != opmask:
-                        ch.opmask = opmask
-                        ch.keyid += 1
-                case (0, 0x2B):
-                    self.ch(6).dac_en = data[7]
-                case (p, a) if (a & 0xF0) == 0x30:
-                    op = self._get_op(p, a)
-                    op.mult = data[3:0]
-                    if data[6] == 0:
-                        op.dt = data[5:4]
-                    else:
-                        op.dt = -data[5:4]
-                case (p, a) if (a & 0xF0) == 0x40:
-                    self._get_op(p, a).tl = data[6:0]
-                case (p, a) if (a & 0xF0) == 0x50:
-                    op = self._get_op(p, a)
-                    op.ar = data[4:0]
-                    op.rs = data[7:6]
-                case (p, a) if (a & 0xF0) == 0x60:
-                    op = self._get_op(p, a)
-                    op.dr = data[4:0]
-                    op.am = data[7]
-                case (p, a) if (a & 0xF0) == 0x70:
-                    self._get_op(p, a).sr = data[4:0]
-                case (p, a) if (a & 0xF0) == 0x80:
-                    op = self._get_op(p, a)
-                    op.rr = data[3:0]
-                    op.sl = data[7:4]
-                case (p, a) if (a & 0xF0) == 0x90:
-                    op = self._get_op(p, a)
-                    op.ssg = data[2:0]
-                    op.ssg_en = data[3]
-                case (p, a) if (a & 0xFC) == 0xA0:
-                    ch = self._get_ch(p, a)
-                    res = ch.latch.low(data)
-                    if res is not None:
-                        ch.freq, ch.block = res
-                case (p, a) if (a & 0xFC) == 0xA4:
-                    ch = self._get_ch(p, a)
-                    res = ch.latch.high(data)
-                    if res is not None:
-                        ch.freq, ch.block = res
-                case (0, a) if (a & 0xFC) == 0xA8:
-                    op = self._get_ch3_op(a)
-                    res = op.latch.low(data)
-                    if res is not None:
-                        op.freq, op.block = res
-                case (0, a) if (a & 0xFC) == 0xAC:
-                    op = self._get_ch3_op(a)
-                    res = op.latch.high(data)
-                    if res is not None:
-                        op.freq, op.block = res
-                case (p, a) if (a & 0xFC) == 0xB0:
-                    ch = self._get_ch(p, a)
-                    ch.alg = data[2:0]
-                    ch.fb = data[5:3]
-                case (p, a) if (a & 0xFC) == 0xB4:
-                    ch = self._get_ch(p, a)
-                    ch.pms = data[2:0]
-                    ch.ams = data[5:4]
-                    ch.pan = data[7:6]
-                case _:
-                    pass
-        except IllFormedEvent as err:
-            warnings.warn(str(err))
+        """Applies a register write. Raises `IllFormedEvent` if the write
+        makes no sense; the register is stored anyway."""
+        i = port * 0xC0 + addr
+        if self.regs[i] != data:
+            self.regs[i] = data
+            self.generation += 1
+        handler, x, y = _DISPATCH[port << 8 | addr]
+        if handler is not None:
+            handler(self, x, y, data)
+
+    # register write handlers; see `_make_dispatch_table` for `x` and `y`
+
+    def _write_lfo(self, x, y, data):
+        reg = regs.LFO[data]
+        self.fields[_LFO] = reg.freq
+        self.fields[_LFO_EN] = reg.enable
+
+    def _write_ch3_mode(self, x, y, data):
+        self.fields[_MODE] = regs.CH3_MODE[data].mode
+
+    def _write_key_on(self, x, y, data):
+        reg = regs.KEY_ON[data]
+        if reg.subch == 3:
+            raise IllFormedEvent((0x52, 0x28, data))
+        ch = reg.subch + 3 * reg.port
+        i = _ch_base(ch) + _OPMASK
+        if self.fields[i] != reg.opmask:
+            self.fields[i] = reg.opmask
+            self.keyids[ch] += 1
+            self.generation += 1
+
+    def _write_dac_en(self, x, y, data):
+        self.fields[_DAC_EN] = regs.DAC_ENABLE[data].enable
+
+    def _write_dt_mult(self, base, y, data):
+        reg = regs.DT_MULT[data]
+        self.fields[base + _MULT] = reg.mult
+        self.fields[base + _DT] = reg.dt if reg.dt_sign == 0 else -reg.dt
+
+    def _write_tl(self, base, y, data):
+        self.fields[base + _TL] = regs.TL[data].tl
+
+    def _write_rs_ar(self, base, y, data):
+        reg = regs.RS_AR[data]
+        self.fields[base + _AR] = reg.ar
+        self.fields[base + _RS] = reg.rs
+
+    def _write_am_dr(self, base, y, data):
+        reg = regs.AM_DR[data]
+        self.fields[base + _DR] = reg.dr
+        self.fields[base + _AM] = reg.am
+
+    def _write_sr(self, base, y, data):
+        self.fields[base + _SR] = regs.SR[data].sr
+
+    def _write_sl_rr(self, base, y, data):
+        reg = regs.SL_RR[data]
+        self.fields[base + _RR] = reg.rr
+        self.fields[base + _SL] = reg.sl
+
+    def _write_ssg(self, base, y, data):
+        reg = regs.SSG[data]
+        self.fields[base + _SSG] = reg.ssg
+        self.fields[base + _SSG_EN] = reg.enable
+
+    def _write_freq_low(self, latch, i, data):
+        res = self.latches[latch].low(data)
+        if res is not None:
+            self._set_freq(i, *res)
+
+    def _write_freq_high(self, latch, i, data):
+        res = self.latches[latch].high(data)
+        if res is not None:
+            self._set_freq(i, *res)
+
+    def _set_freq(self, i, freq, block):
+        # a latched frequency may be applied by a write that changes no register
+        fields = self.fields
+        if fields[i] != freq or fields[i + 1] != block:
+            fields[i] = freq
+            fields[i + 1] = block
+            self.generation += 1
+
+    def _write_fb_alg(self, base, y, data):
+        reg = regs.FB_ALG[data]
+        self.fields[base + _ALG] = reg.alg
+        self.fields[base + _FB] = reg.fb
+
+    def _write_pan(self, base, y, data):
+        reg = regs.PAN[data]
+        self.fields[base + _PMS] = reg.pms
+        self.fields[base + _AMS] = reg.ams
+        self.fields[base + _PAN] = reg.pan
+
+    def _write_ill_formed(self, port, addr, data):
+        raise IllFormedEvent((0x52 + port, addr, None))
 
     def copy(self):
+        """Snapshot of the decoded state; snapshots cannot be updated."""
         clone = YM2612(noinit=True)
-        clone.channels = [ch.copy() for ch in self.channels]
-        clone.regs = self.regs.copy()
-        return clone
-
-
-class ChannelBase:
-    def __init__(self, /, *, noinit=False):
-        if noinit: return
-        self.keyid = 0
-        self.opmask = 0
-        self.freq = 0
-        self.block = 0
-        self.alg = 0
-        self.fb = 0
-        self.pms = 0
-        self.ams = 0
-        self.pan = 0
-
-    def copy(self):
-        clone = type(self)(noinit=True)
-        clone.keyid = self.keyid
-        clone.opmask = self.opmask
-        clone.freq = self.freq
-        clone.block = self.block
-        clone.alg = self.alg
-        clone.fb = self.fb
-        clone.pms = self.pms
-        clone.ams = self.ams
-        clone.pan = self.pan
+        clone.fields = self.fields[:]
+        clone.keyids = self.keyids[:]
+        clone.regs = None
+        clone.latches = None
+        clone.generation = self.generation
         return clone
 
-
-class Channel(ChannelBase):
-    def __init__(self, /, *, noinit=False):
-        if noinit: return
-        super().__init__()
-        self.latch = FreqLatch()
-        self.operators = [Operator(), Operator(), Operator(), Operator()]
+    packed_size = _PACKED.size
+
+    def pack(self):
+        """Whole state as bytes, which `unpack` turns back into a model."""
+        latches = self.latches
+        return _PACKED.pack(*self.fields, *self.keyids, bytes(self.regs),
+            *(latch.state for latch in latches), *(latch.freq for latch in latches),
+            *(latch.block for latch in latches), self.generation, latches[0].use)
+
+    @classmethod
+    def unpack(cls, data):
+        values = _PACKED.unpack(data)
+        chip = cls(latch=values[-1])
+        chip.fields = array.array('h', values[:_SIZE])
+        chip.keyids = array.array('L', values[_SIZE : _SIZE + 6])
+        chip.regs = bytearray(values[_SIZE + 6])
+        latches = values[_SIZE + 7 : -2]
+        for i, latch in enumerate(chip.latches):
+            latch.state, latch.freq, latch.block = latches[i::_LATCHES]
+        chip.generation = values[-2]
+        return chip
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_channels'] = None
+        return state
+
+
+def channel_key(chip, num):
+    """Hashable value which is equal for equal states of channel `num` (0 to
+    5): the row of channel fields, key id and the fields of the whole chip."""
+    fields = chip.fields
+    base = _ch_base(num)
+    return (fields[base : base + _CH_SIZE].tobytes(), chip.keyids[num],
+        fields[_LFO : _SIZE].tobytes())
+
+def _field(i):
+    return property(lambda self: self._chip.fields[self._base + i])
+
+def _chip_field(i):
+    return property(lambda self: self._chip.fields[i])
+
+
+class Channel:
+    """View of channel `num` (0 to 5) of `chip`."""
+    __slots__ = ('_chip', '_num', '_base', 'operators')
+    def __init__(self, chip, num):
+        self._chip = chip
+        self._num = num
+        self._base = _ch_base(num)
+        self.operators = [Operator(chip, _op_base(num, i)) for i in range(4)]
 
     def op(self, num):
         return self.operators[num - 1]
 
-    def copy(self):
-        clone = super().copy()
-        clone.latch = self.latch
-        clone.operators = [op.copy() for op in self.operators]
-        return clone
+    @property
+    def keyid(self):
+        return self._chip.keyids[self._num]
+
+    opmask = _field(_OPMASK)
+    freq = _field(_FREQ)
+    block = _field(_BLOCK)
+    alg = _field(_ALG)
+    fb = _field(_FB)
+    pms = _field(_PMS)
+    ams = _field(_AMS)
+    pan = _field(_PAN)
 
 
 class Channel1(Channel):
-    def __init__(self, /, *, noinit=False):
-        if noinit: return
-        super().__init__()
-        self.lfo = 0
-        self.lfo_en = 0
+    __slots__ = ()
+    lfo = _chip_field(_LFO)
+    lfo_en = _chip_field(_LFO_EN)
 
-    def copy(self):
-        clone = super().copy()
-        clone.lfo = self.lfo
-        clone.lfo_en = self.lfo_en
-        return clone
 
+class Channel3(Channel):
+    __slots__ = ()
+    def __init__(self, chip, num):
+        super().__init__(chip, num)
+        self.operators = [Operator3(chip, _op_base(num, i)) for i in range(3)]
+        self.operators.append(Operator3_4(chip, _op_base(num, 3)))
 
-class Channel3(ChannelBase):
-    def __init__(self, /, *, noinit=False):
-        if noinit: return
-        super().__init__()
-        self.mode = 0
-        self.latch = FreqLatch()
-        self.operators = [Operator3(), Operator3(), Operator3(), Operator3_4(self)]
+    mode = _chip_field(_MODE)
 
-    op = Channel.op
 
-    def copy(self):
-        clone = super().copy()
-        clone.mode = self.mode
-        clone.latch = self.latch
-        clone.operators = [
-            self.operators[0].copy(),
-            self.operators[1].copy(),
-            self.operators[2].copy(),
-            self.operators[3].copy(clone),
-        ]
-        return clone
+class Channel6(Channel):
+    __slots__ = ()
+    dac_en = _chip_field(_DAC_EN)
 
 
-class Channel6(Channel):
-    def __init__(self, /, *, noinit=False):
-        if noinit: return
-        super().__init__()
-        self.dac_en = 0
+_CHANNEL_TYPES = (Channel1, Channel, Channel3, Channel, Channel, Channel6)
 
-    def copy(self):
-        clone = super().copy()
-        clone.dac_en = self.dac_en
-        return clone
+def channel(chip, num):
+    """View of channel `num` (0 to 5) of `chip`, without the other ones."""
+    if chip._channels is not None:
+        return chip._channels[num]
+    return _CHANNEL_TYPES[num](chip, num)
 
 
 class Operator:
-    def __init__(self, /, *, noinit=False):
-        if noinit: return
-        self.mult = 0
-        self.dt = 0
-        self.tl = 0
-        self.ar = 0
-        self.rs = 0
-        self.dr = 0
-        self.am = 0
-        self.sr = 0
-        self.rr = 0
-        self.sl = 0
-        self.ssg = 0
-        self.ssg_en = 0
-
-    def copy(self):
-        clone = type(self)(noinit=True)
-        clone.mult = self.mult
-        clone.dt = self.dt
-        clone.tl = self.tl
-        clone.ar = self.ar
-        clone.rs = self.rs
-        clone.dr = self.dr
-        clone.am = self.am
-        clone.sr = self.sr
-        clone.rr = self.rr
-        clone.sl = self.sl
-        clone.ssg = self.ssg
-        clone.ssg_en = self.ssg_en
-        return clone
+    """View of the operator whose fields start at `base` in `chip`."""
+    __slots__ = ('_chip', '_base')
+    def __init__(self, chip, base):
+        self._chip = chip
+        self._base = base
+
+    mult = _field(_MULT)
+    dt = _field(_DT)
+    tl = _field(_TL)
+    ar = _field(_AR)
+    rs = _field(_RS)
+    dr = _field(_DR)
+    am = _field(_AM)
+    sr = _field(_SR)
+    rr = _field(_RR)
+    sl = _field(_SL)
+    ssg = _field(_SSG)
+    ssg_en = _field(_SSG_EN)
+
+    def values(self):
+        """Fields `mult` to `ssg_en` as a tuple, in the order of their
+        declarations above."""
+        return tuple(self._chip.fields[self._base : self._base + _OP_FREQ])
 
 
 class Operator3(Operator):
-    def __init__(self, /, *, noinit=False):
-        if noinit: return
-        super().__init__()
-        self.freq = 0
-        self.block = 0
-        self.latch = FreqLatch()
-
-    def copy(self):
-        clone = super().copy()
-        clone.freq = self.freq
-        clone.block = self.block
-        clone.latch = self.latch
-        return clone
+    __slots__ = ()
+    freq = _field(_OP_FREQ)
+    block = _field(_OP_BLOCK)
 
 
 class Operator3_4(Operator):
-    def __init__(self, owner=None, /, *, noinit=False):
-        if noinit: return
-        super().__init__()
-        self._owner = owner
+    __slots__ = ()
+    # operator 4 of channel 3 uses the channel frequency
+    freq = _chip_field(_ch_base(2) + _FREQ)
+    block = _chip_field(_ch_base(2) + _BLOCK)
+
+
+def _make_dispatch_table():
+    """Maps `port << 8 | addr` of every register to `(handler, x, y)`: the `YM2612`
+    method applying writes to it (None if they have no effect) and its arguments."""
+    op_map = [0, 2, 1, 3]
+    ch3_op_map = [2, 0, 1]
+    op_handlers = {
+        0x30: YM2612._write_dt_mult,
+        0x40: YM2612._write_tl,
+        0x50: YM2612._write_rs_ar,
+        0x60: YM2612._write_am_dr,
+        0x70: YM2612._write_sr,
+        0x80: YM2612._write_sl_rr,
+        0x90: YM2612._write_ssg,
+    }
+    ch_handlers = {
+        0xB0: YM2612._write_fb_alg,
+        0xB4: YM2612._write_pan,
+    }
+    freq_handlers = {
+        0xA0: YM2612._write_freq_low,
+        0xA4: YM2612._write_freq_high,
+    }
+    ch3_op_freq_handlers = {
+        0xA8: YM2612._write_freq_low,
+        0xAC: YM2612._write_freq_high,
+    }
+    table = [(None, None, None)] * 0x200
+    table[0x22] = (YM2612._write_lfo, None, None)
+    table[0x27] = (YM2612._write_ch3_mode, None, None)
+    table[0x28] = (YM2612._write_key_on, None, None)
+    table[0x2B] = (YM2612._write_dac_en, None, None)
+    for port in range(2):
+        for addr in range(0x100):
+            subch = addr & 3
+            ch = subch + port * 3
+            if (handler := op_handlers.get(addr & 0xF0)) is not None:
+                entry = (handler, _op_base(ch, op_map[(addr >> 2) & 3]), None)
+            elif (handler := ch_handlers.get(addr & 0xFC)) is not None:
+                entry = (handler, _ch_base(ch), None)
+            elif (handler := freq_handlers.get(addr & 0xFC)) is not None:
+                entry = (handler, ch, _ch_base(ch) + _FREQ)
+            elif port == 0 and (handler := ch3_op_freq_handlers.get(addr & 0xFC)) is not None:
+                if subch != 3:
+                    op = ch3_op_map[subch]
+                    entry = (handler, _CH3_OP_LATCH + op, _op_base(2, op) + _OP_FREQ)
+            else:
+                continue
+            if subch == 3:
+                entry = (YM2612._write_ill_formed, port, addr)
+            table[port << 8 | addr] = entry
+    return tuple(table)
 
-    @property
-    def freq(self): return self._owner.freq
-    @property
-    def block(self): return self._owner.block
+_DISPATCH = _make_dispatch_table()
 
-    def copy(self, owner):
-        clone = super().copy()
-        clone._owner = owner
-        return clone
+def ill_formed(port, addr, data):
+    """Whether `YM2612.update` reports a write as ill-formed."""
+    handler = _DISPATCH[port << 8 | addr][0]
+    if handler is YM2612._write_key_on:
+        return regs.KEY_ON[data].subch == 3
+    return handler is YM2612._write_ill_formed
 
 
 _OPMASK_MAP = {'0': '.', '1': '#'}
@@ -337,6 +442,12 @@ _CHIP_FEATURES = frozenset('lfo dacen fm1 fm2 fm3 fm4 fm5 fm6 fmx freqfm3'.split
 _CHANNEL_FEATURES = frozenset('id opmask freqfm alg fb mod pan op1 op2 op3 op4 opx'.split())
 _OPERATOR_FEATURES = frozenset('mult dt tl ar rs dr am sr rr sl ssg'.split())
 def csv(chip_states, src_features):
+    ymft, chft, opft = _features(src_features)
+    if len(ymft) == 0:
+        return None
+    return _csv(chip_states, ymft, chft, opft)
+
+def _features(src_features):
     ymft = []
     chft = []
     opft = []
@@ -347,12 +458,57 @@ def csv(chip_states, src_features):
             chft.append(feature)
         elif feature in _OPERATOR_FEATURES:
             opft.append(feature)
-    ymft = _norm_chip(ymft)
-    chft = _norm_channel(chft)
-    opft = _norm_operator(opft)
+    return _norm_chip(ymft), _norm_channel(chft), _norm_operator(opft)
+
+_CHANNEL_FIELDS = {
+    'opmask': (_OPMASK,), 'freqfm': (_FREQ, _BLOCK), 'alg': (_ALG,), 'fb': (_FB,),
+    'mod': (_AMS, _PMS), 'pan': (_PAN,),
+}
+_OPERATOR_FIELDS = {
+    'mult': (_MULT,), 'dt': (_DT,), 'tl': (_TL,), 'ar': (_AR,), 'rs': (_RS,), 'dr': (_DR,),
+    'am': (_AM,), 'sr': (_SR,), 'rr': (_RR,), 'sl': (_SL,), 'ssg': (_SSG, _SSG_EN),
+}
+
+def projection(src_features):
+    """Returns a function of a `YM2612` whose value changes whenever anything
+    `csv` prints for `src_features` does, or None if `csv` prints nothing."""
+    ymft, chft, opft = _features(src_features)
     if len(ymft) == 0:
         return None
-    return _csv(chip_states, ymft, chft, opft)
+    fields = set()
+    keyids = set()
+    for ft in ymft:
+        match ft:
+            case 'lfo':
+                fields |= {_LFO, _LFO_EN}
+            case 'dacen':
+                fields.add(_DAC_EN)
+            case 'freqfm3':
+                fields |= {_MODE, _ch_base(2) + _FREQ, _ch_base(2) + _BLOCK}
+                for op in range(3):
+                    fields |= {_op_base(2, op) + _OP_FREQ, _op_base(2, op) + _OP_BLOCK}
+            case 'fm1' | 'fm2' | 'fm3' | 'fm4' | 'fm5' | 'fm6':
+                ch = int(ft[2]) - 1
+                if ch == 5:
+                    fields.add(_DAC_EN)
+                for chft1 in chft:
+                    match chft1:
+                        case 'id':
+                            keyids.add(ch)
+                        case 'op1' | 'op2' | 'op3' | 'op4':
+                            base = _op_base(ch, int(chft1[2]) - 1)
+                            for opft1 in opft:
+                                fields.update(base + i for i in _OPERATOR_FIELDS[opft1])
+                        case _:
+                            fields.update(_ch_base(ch) + i for i in _CHANNEL_FIELDS[chft1])
+    get_fields = _getter(sorted(fields))
+    get_keyids = _getter(sorted(keyids))
+    return lambda chip: (get_fields(chip.fields), get_keyids(chip.keyids))
+
+def _getter(indices):
+    if len(indices) == 0:
+        return lambda seq: ()
+    return operator.itemgetter(*indices)
 
 def _csv(chip_states, ymft, chft, opft):
     yield _csv_header(ymft, chft, opft)
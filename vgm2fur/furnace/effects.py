@@ -5,4 +5,6 @@ def pitch_down(freq_units): return (0xF2, freq_units)
 def pan(value): return (0x08, value)
 def legato(value): return (0xEA, value)
 def noise_mode(value): return (0x20, value)
-def lfo(value): return (0x10, value)
\ No newline at end of file
+def lfo(value): return (0x10, value)
+def jump_to_order(order): return (0x0B, order)
+def jump_to_row(row): return (0x0D, row)
\ No newline at end of file
@@ -1,4 +1,5 @@
 from . import builder
+from . import effects
 import zlib
 
 TARGET_FURNACE_VERSION = 228  # Furnace v0.6.8.1
@@ -39,10 +40,10 @@ def _make_entry_data(note, ins, vol, fx):
 class Entry:
     def __init__(self, note=None, ins=None, vol=None, fx=None):
         self.data = _make_entry_data(note, ins, vol, fx)
-        # self.note = note
-        # self.ins = ins
-        # self.vol = vol
-        # self.fx = fx
+        self.note = note
+        self.ins = ins
+        self.vol = vol
+        self.fx = fx
         self.fxcount = len(fx) if fx is not None else 0
 
     @property
@@ -59,6 +60,30 @@ class Emit:
     def __init__(self, data):
         self.data = data
 
+def _loop_back(entries, jump, force, onresult):
+    """Passthrough. Adds `jump` after the effects of the last entry if the
+    effect columns of the entries have room for it, or if `force` is set.
+    Sends the number of entries and whether the jump was added to the
+    callback `onresult`."""
+    columns = 1
+    count = 0
+    last = None
+    for entry in entries:
+        if last is not None:
+            yield last
+        last = entry
+        count += 1
+        if entry.fxcount > columns:
+            columns = entry.fxcount
+    if last is None:
+        onresult(0, False)
+    elif force or last.fxcount + len(jump) <= columns:
+        yield Entry(last.note, last.ins, last.vol, (last.fx or []) + jump)
+        onresult(count, True)
+    else:
+        yield last
+        onresult(count, False)
+
 def _pass_entries(entries, onresult):
     """Passthrough. Remembers the biggest effect count across all entries.
     Sends found maximum of effect count to the callback `onresult`."""
@@ -167,6 +192,9 @@ class Module:
         self.sn76489_volume = 1.0
         self.song_comment = ''
         self._fm3sp = False
+        self._jump = None
+        self._rows = 0
+        self._added = set()
 
     @property
     def instrument_count(self):
@@ -224,11 +252,23 @@ class Module:
                         raise TypeError('invalid value for "channel"')
         else:
             raise TypeError('invalid type for "channel"')
+        self._add_patterns(entries, channel)
 
+    def _add_patterns(self, entries, channel, *, force=False):
         def _update_effects_count(fxcount):
             if fxcount > 0:
                 self.effects_count[channel] = fxcount
 
+        def _update_jump(rows, added):
+            self._rows = max(self._rows, rows)
+            if added:
+                self._jump = None
+
+        self._added.add(channel)
+        if self._jump is not None:
+            # the last channel to be added takes the jump whatever it costs
+            force = force or len(self._added) == self.channel_count
+            entries = _loop_back(entries, self._jump, force, _update_jump)
         new_patterns = list(
             _patterns(channel,
                 _chunks(self.pattern_length,
@@ -247,7 +287,18 @@ class Module:
     def add_sample(self, samp):
         self.samples.append(samp)
 
+    def loop_back(self, row):
+        """Makes the song jump to `row`, counted from its start, after its
+        last row. The jump goes to the first channel added afterwards whose
+        last row has free effect columns, or else to the last one."""
+        self._jump = [effects.jump_to_order(row // self.pattern_length),
+            effects.jump_to_row(row % self.pattern_length)]
+
     def prebuild(self):
+        if self._jump is not None and self._rows > 0:
+            # some channel was never added, so it carries the jump alone
+            chno = next(i for i in range(self.channel_count) if i not in self._added)
+            self._add_patterns([Entry()] * self._rows, chno, force=True)
         for chno, ch in enumerate(self.pattern_matrix):
             index = 0
             while len(ch) < self.order_count:
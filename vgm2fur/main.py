@@ -10,11 +10,15 @@ import contextlib
 import gzip
 import zlib
 import itertools
+import math
+import functools
+import operator
 import warnings
 import os
 from typing import NamedTuple, Any
 
 def main():
+    warnings.showwarning = _warning
     try:
         _main()
     except AppError as err:
@@ -36,7 +40,8 @@ def _main():
         opts, args = getopt.gnu_getopt(sys.argv[1:], 'o:z',
             ['print-istate=', 'version', 'decompress', 'unsampled',
             'print-vgm=', 'playback-rate=', 'row-duration=', 'pattern-length=',
-            'skip-samples=', 'sn76489-volume=', 'ym2612-volume=', 'no-latch'])
+            'skip-samples=', 'sn76489-volume=', 'ym2612-volume=', 'no-latch', 'no-loop',
+            'format=', 'jobs=', 'index', 'end-samples=', 'from=', 'to=', 'cache'])
     except getopt.GetoptError as err:
         raise ArgParseError(err)
 
@@ -56,7 +61,11 @@ def _main():
                     'unsampled': '',
                     'pattern_length': 'pattern length',
                     'row_duration': 'row duration',
-                    'skip_samples': 'skipped samples count'
+                    'skip_samples': 'skipped samples count',
+                    'end_samples': 'end sample',
+                    'use_index': 'keyframe index',
+                    'use_cache': 'event cache',
+                    'jobs': 'decoder process count'
                 }
                 params.csv_features = param
                 params.outfile = DefaultValue(None)
@@ -64,6 +73,10 @@ def _main():
                 params.pattern_length = DefaultValue(128)
                 params.row_duration = DefaultValue(735)
                 params.skip_samples = DefaultValue(0)
+                params.end_samples = DefaultValue(None)
+                params.use_index = DefaultValue(False)
+                params.use_cache = DefaultValue(False)
+                params.jobs = DefaultValue(1)
             case '--version':
                 action = Action.VERSION
                 params.target = {'version': None}
@@ -77,10 +90,22 @@ def _main():
             case '--print-vgm':
                 action = Action.PRINT_VGM
                 params.target = io_target | {
-                    'vgm_features': 'VGM feature list'
+                    'vgm_features': 'VGM feature list',
+                    'format': 'output format',
+                    'begin_sample': 'first sample',
+                    'end_sample': 'end sample',
+                    'use_index': 'keyframe index',
+                    'use_cache': 'event cache',
+                    'jobs': 'decoder process count'
                 }
                 params.vgm_features = param
                 params.outfile = DefaultValue(None)
+                params.format = DefaultValue('csv')
+                params.begin_sample = DefaultValue(0)
+                params.end_sample = DefaultValue(None)
+                params.use_index = DefaultValue(False)
+                params.use_cache = DefaultValue(False)
+                params.jobs = DefaultValue(1)
             case '--pattern-length':
                 params.pattern_length = _parse_param(param, int)
                 _assert_param(params['pattern_length'], lambda x: 0 < x and x <= 256)
@@ -93,6 +118,19 @@ def _main():
             case '--skip-samples':
                 params.skip_samples = _parse_param(param, float)
                 _assert_param(params['skip_samples'], lambda x: x >= 0)
+            case '--end-samples':
+                params.end_samples = _parse_param(param, float)
+                _assert_param(params['end_samples'], lambda x: x > 0)
+            case '--from':
+                params.begin_sample = _parse_param(param, int)
+                _assert_param(params['begin_sample'], lambda x: x >= 0)
+            case '--to':
+                params.end_sample = _parse_param(param, int)
+                _assert_param(params['end_sample'], lambda x: x > 0)
+            case '--index':
+                params.use_index = Param(key, True)
+            case '--cache':
+                params.use_cache = Param(key, True)
             case '--ym2612-volume':
                 params.ym2612_volume = _parse_param(param, float)
                 _assert_param(params['ym2612_volume'], lambda x: x >= 0)
@@ -101,6 +139,14 @@ def _main():
                 _assert_param(params['sn76489_volume'], lambda x: x >= 0)
             case '--no-latch':
                 params.use_latch = Param(key, False)
+            case '--no-loop':
+                params.use_loop = Param(key, False)
+            case '--format':
+                params.format = param
+                _assert_param(params['format'], lambda x: x in {'csv', 'npz'})
+            case '--jobs':
+                params.jobs = _parse_param(param, int)
+                _assert_param(params['jobs'], lambda x: x > 0)
 
     try:
         iargs = iter(args)
@@ -114,7 +160,12 @@ def _main():
                 'skip_samples': 'skipped samples count',
                 'ym2612_volume': 'YM2612 volume',
                 'sn76489_volume': 'SN76489 volume',
-                'use_latch': 'FM frequency latch deactivation'
+                'use_latch': 'FM frequency latch deactivation',
+                'use_loop': 'loop deactivation',
+                'end_samples': 'end sample',
+                'use_index': 'keyframe index',
+                'use_cache': 'event cache',
+                'jobs': 'decoder process count'
             }
             params.outfile = DefaultValue(None)
             params.playback_rate = DefaultValue(None)
@@ -124,6 +175,11 @@ def _main():
             params.ym2612_volume = DefaultValue(1.0)
             params.sn76489_volume = DefaultValue(1.0)
             params.use_latch = DefaultValue(True)
+            params.use_loop = DefaultValue(True)
+            params.end_samples = DefaultValue(None)
+            params.use_index = DefaultValue(False)
+            params.use_cache = DefaultValue(False)
+            params.jobs = DefaultValue(1)
         for arg in iargs:
             params.ignored = Param.positional(arg)
     except StopIteration:
@@ -329,14 +385,102 @@ def _warning(message, category, filename, lineno, file=None, line=None):
     if file is None:
         file = sys.stderr
     print(f'warning: {message}', file=file)
-warnings.showwarning = _warning
 
-def convert(params):
-    infile = params.infile
+def _load(filename, *, cache=False):
+    try:
+        if filename == '-':
+            return vgm.PipeSong(sys.stdin.buffer, name='<stdin>')
+        song = vgm.load(filename)
+        if cache:
+            song = vgm.cached(song, filename)
+        return song
+    except OSError as err:
+        raise FileOpenReadError(filename, err) from None
+
+def _default_outfile(infile, ext):
+    if infile == '-':
+        raise MissingParameter('output file')
+    base, _ = os.path.splitext(infile)
+    return base + ext
+
+def _song_events(song, jobs):
+    # pipes can only be read once, and cached songs are not decoded at all
+    if jobs == 1 or isinstance(song, (vgm.CachedSong, vgm.PipeSong)):
+        return song.events
+    return functools.partial(vgm.parallel_events, song, jobs=jobs)
+
+def _load_index(params, latch):
+    if not params.use_index or params.infile == '-':
+        return None, None
+    path = transform.index_path(params.infile)
+    key = transform.file_key(params.infile, latch)
+    return path, transform.load_index(path, key) or transform.Index(key)
+
+def _changes(song, params, chiplist, *, start=0, end=None, latch=False, keys=None):
+    """Rows `(t, state, ...)` for every change of chip states, read lazily."""
+    path, index = _load_index(params, latch)
+    diagnostics = []
+    if index is None:
+        rows, _ = transform.changes(_song_events(song, params.jobs), chips=chiplist, end=end,
+            latch=latch, keys=keys, diagnostics=diagnostics)
+        yield from rows
+    elif index.complete:
+        rows, _ = transform.changes(song.cursor, chips=chiplist, start=start, end=end,
+            index=index, latch=latch, keys=keys, diagnostics=diagnostics)
+        yield from rows
+    else:
+        eprint('Building keyframe index...')
+        rows, _ = transform.changes(song.cursor, chips=chiplist, end=end, index=index,
+            latch=latch, keys=keys, diagnostics=diagnostics)
+        yield from rows
+        _save_index(index, path)
+    _report(diagnostics)
+
+def _sample(song, params, chiplist, *, length, period, skip=0, latch=False, keys=None):
+    """Samples chip states at every row; returns state lists and data blocks."""
+    path, index = _load_index(params, latch)
+    diagnostics = []
+    building = index is not None and not index.complete
+    if index is None:
+        rows, datablocks = transform.sample(_song_events(song, params.jobs), chips=chiplist,
+            length=length, period=period, skip=skip, latch=latch, keys=keys,
+            diagnostics=diagnostics)
+    else:
+        if building:
+            eprint('Building keyframe index...')
+        rows, datablocks = transform.sample(song.cursor, chips=chiplist, index=index,
+            length=length, period=period, skip=skip, latch=latch, keys=keys,
+            diagnostics=diagnostics)
+    columns = tuple([] for chip in chiplist if chip != 'data')
+    for row in rows:
+        for column, state in zip(columns, row):
+            column.append(state)
+    if building:
+        _save_index(index, path)
+    _report(diagnostics)
+    return columns, datablocks
+
+def _report(diagnostics):
+    for err in diagnostics:
+        warnings.warn(str(err))
+
+def _save_index(index, path):
     try:
-        song = vgm.load(infile)
+        transform.save_index(index, path)
     except OSError as err:
-        raise FileOpenReadError(params.infile, err) from None
+        warnings.warn(f'cannot write keyframe index "{path}": {err.strerror}')
+
+def _song_length(song, end):
+    if end is None:
+        return song.total_wait
+    return min(song.total_wait, end)
+
+def convert(params):
+    infile = params.infile
+    outfile = params.outfile
+    if outfile is None:
+        outfile = _default_outfile(infile, '.fur')
+    song = _load(infile, cache=params.use_cache)
 
     match (params.row_duration, params.playback_rate, song.playback_rate):
         case (None, None, 0):
@@ -355,27 +499,35 @@ def convert(params):
             row_duration = x
             playback_rate = y
 
-    total_wait = song.total_wait
+    total_wait = _song_length(song, params.end_samples)
     skip_samples = params.skip_samples
     pattern_length = params.pattern_length
+    loop = song.loop() if params.use_loop else None
+    if loop is not None and skip_samples <= loop.start and loop.end <= total_wait:
+        # the rest of the song is converted once and played by looping
+        total_wait = loop.end
+        loop_row = math.ceil((loop.start - skip_samples) / row_duration)
+    else:
+        loop_row = None
     songlen = total_wait - skip_samples
     maxlen = int(row_duration * pattern_length * 256)
     if songlen > maxlen:
         raise SongTooLong(songlen, maxlen)
 
     eprint('Constructing state table...')
-    chips.ym2612.FreqLatch.use = params.use_latch
-    chiptable, datablocks = transform.tabulate(song.events, chips=['ym2612', 'sn76489', 'dac', 'data'])
-
-    ym2612, sn76489, dac = transform.interpolate(chiptable,
+    (ym2612, sn76489, dac), datablocks = _sample(song, params,
+        ['ym2612', 'sn76489', 'dac', 'data'],
         length=total_wait,
         period=row_duration,
-        skip=skip_samples)
+        skip=skip_samples,
+        latch=params.use_latch)
 
     eprint('Translating state table to tracker events...')
     fur = furnace.Module()
     fur.ticks_per_second = playback_rate
     fur.pattern_length = pattern_length
+    if loop_row is not None and loop_row < len(sn76489):
+        fur.loop_back(loop_row)
 
     psg1, psg2, psg3, noise = transform.psg.prepare(sn76489)
     fm1, fm2, fm3, fm4, fm5, fm6 = transform.fm.prepare(ym2612)
@@ -427,50 +579,51 @@ def convert(params):
     fur.song_comment = f'Generated with vgm2fur v{vgm2fur_version}'
     result = fur.build()
 
-    outfile = params.outfile
-    if outfile is None:
-        base, ext = os.path.splitext(infile)
-        outfile = base + '.fur'
-
     with open(outfile, 'wb') as f:
         f.write(result)
     eprint('Done.')
 
 def print_istate(params):
-    try:
-        song = vgm.load(params.infile)
-    except OSError as err:
-        raise FileOpenReadError(params.infile, err) from None
+    song = _load(params.infile, cache=params.use_cache)
 
     features = params.csv_features.split(',')
     if len(features) == 0:
         raise MissingParameter('CSV feature list')
 
+    # only chips and fields which are printed are tracked
+    keys = {
+        'ym2612': chips.ym2612.projection(features),
+        'sn76489': chips.sn76489.projection(features),
+        'dac': chips.sampler.projection(features),
+    }
+    chiplist = [chip for chip, key in keys.items() if key is not None]
+    if len(chiplist) == 0:
+        eprint('Nothing to write.')
+        return
+
     if params.unsampled:
         eprint('Constructing state table...')
-        chiptable, _ = transform.tabulate(song.events,
-            chips=['ym2612', 'sn76489', 'dac'])
-
-        (t, fm, psg, dac) = transform.merge(chiptable)
+        rows = _changes(song, params, chiplist, end=params.end_samples, keys=keys)
+        # columns are read in step, so rows are never all held in memory
+        t, *columns = (map(operator.itemgetter(i), column)
+            for i, column in enumerate(itertools.tee(rows, 1 + len(chiplist))))
+        states = dict(zip(chiplist, columns))
 
-        eprint('Writing output...')
         def t_csv(t):
             yield 'Sample'
             yield from map(str, t)
         data = [t_csv(t)]
-        if (fm := chips.ym2612.csv(fm, features)) is not None: data.append(fm)
-        if (psg := chips.sn76489.csv(psg, features)) is not None: data.append(psg)
-        if (dac := chips.sampler.csv(dac, features)) is not None: data.append(dac)
     else:
         pattern_length = params.pattern_length
 
         eprint('Constructing state table...')
-        chiptable, _ = transform.tabulate(song.events, chips=['ym2612', 'sn76489', 'dac'])
-
-        fm, psg, dac = transform.interpolate(chiptable, 
-            length=song.total_wait,
+        length = _song_length(song, params.end_samples)
+        columns, _ = _sample(song, params, chiplist,
+            length=length,
             period=params.row_duration,
-            skip=params.skip_samples)
+            skip=params.skip_samples,
+            keys=keys)
+        states = dict(zip(chiplist, columns))
 
         def patrow_csv(patlen):
             yield 'Pat:Row'
@@ -479,17 +632,14 @@ def print_istate(params):
                 row = i % patlen
                 yield f'{pat}:{row}'
         data = [patrow_csv(pattern_length)]
-        if (fm := chips.ym2612.csv(fm, features)) is not None: data.append(fm)
-        if (psg := chips.sn76489.csv(psg, features)) is not None: data.append(psg)
-        if (dac := chips.sampler.csv(dac, features)) is not None: data.append(dac)
-    if len(data) == 1:
-        eprint('Nothing to write.')
-    else:
-        eprint('Writing output...')
-        with _open_write_or(params.outfile, defaultfile=sys.stdout) as f:
-            for items in zip(*data):
-                print(','.join(items), file=f)
-        eprint('Done.')
+    if 'ym2612' in states: data.append(chips.ym2612.csv(states['ym2612'], features))
+    if 'sn76489' in states: data.append(chips.sn76489.csv(states['sn76489'], features))
+    if 'dac' in states: data.append(chips.sampler.csv(states['dac'], features))
+    eprint('Writing output...')
+    with _open_write_or(params.outfile, defaultfile=sys.stdout) as f:
+        for items in zip(*data):
+            print(','.join(items), file=f)
+    eprint('Done.')
 
 def _try_decompress(data, method):
     try:
@@ -526,17 +676,43 @@ def print_usage():
     eprint(usage)
 
 def print_vgm(params):
-    try:
-        song = vgm.load(params.infile)
-    except OSError as err:
-        raise FileOpenReadError(params.infile, err) from None
+    song = _load(params.infile, cache=params.use_cache)
 
     features = params.vgm_features.split(',')
     if len(features) == 0:
         raise MissingParameter('VGM feature list')
 
+    if params.format == 'npz':
+        outfile = params.outfile
+        if outfile is None:
+            outfile = _default_outfile(params.infile, '.npz')
+
+        eprint('Decoding events...')
+        columns = vgm.decode_columnar(song, *features)
+
+        eprint('Writing output...')
+        with _open_write(outfile) as f:
+            vgm.write_npz(columns, f)
+        eprint('Done.')
+        return
+
+    begin = params.begin_sample
+    end = params.end_sample
+    # only keyframe offsets are used, so any complete index will do; none is
+    # built here, since that takes tabulating the whole song
+    index = None
+    if params.use_index and params.infile != '-':
+        index = transform.load_index(transform.index_path(params.infile),
+            transform.file_key(params.infile, None), offsets_only=True)
+    if index is not None and (keyframe := index.find(begin)) is not None:
+        events = song.events(*features, start=keyframe.offset)
+        t = keyframe.t
+    else:
+        events = _song_events(song, params.jobs)(*features)
+        t = 0
+
     eprint('Writing output...')
     with _open_write_or(params.outfile, defaultfile=sys.stdout) as f:
-        for csv in vgm.events_csv(song.events(*features)):
+        for csv in vgm.events_csv(events, t=t, begin=begin, end=end):
             print(csv, file=f)
     eprint('Done.')
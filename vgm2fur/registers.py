@@ -0,0 +1,93 @@
+"""Bit layouts of YM2612 and SN76489 registers, and lookup tables decoding
+every 8-bit value written to them."""
+from vgm2fur import bitfield
+from vgm2fur.bitfield import named
+
+# YM2612
+
+class LfoBF(bitfield.Bitfield):  # 0x22
+    freq = named[2:0]
+    enable = named[3]
+
+class Ch3ModeBF(bitfield.Bitfield):  # 0x27
+    mode = named[7:6]
+
+class KeyOnBF(bitfield.Bitfield):  # 0x28
+    channel = named[2:0]
+    subch = named[1:0]
+    port = named[2]
+    opmask = named[7:4]
+
+class DacEnableBF(bitfield.Bitfield):  # 0x2B
+    enable = named[7]
+
+class AddressBF(bitfield.Bitfield):  # channel and operator registers
+    subch = named[1:0]
+    op = named[3:2]
+
+class DtMultBF(bitfield.Bitfield):  # 0x30
+    mult = named[3:0]
+    dt = named[5:4]
+    dt_sign = named[6]
+
+class TlBF(bitfield.Bitfield):  # 0x40
+    tl = named[6:0]
+
+class RsArBF(bitfield.Bitfield):  # 0x50
+    ar = named[4:0]
+    rs = named[7:6]
+
+class AmDrBF(bitfield.Bitfield):  # 0x60
+    dr = named[4:0]
+    am = named[7]
+
+class SrBF(bitfield.Bitfield):  # 0x70
+    sr = named[4:0]
+
+class SlRrBF(bitfield.Bitfield):  # 0x80
+    rr = named[3:0]
+    sl = named[7:4]
+
+class SsgBF(bitfield.Bitfield):  # 0x90
+    ssg = named[2:0]
+    enable = named[3]
+
+class BlockFreqBF(bitfield.Bitfield):  # 0xA4, 0xAC
+    freq = named[2:0]
+    block = named[5:3]
+
+class FbAlgBF(bitfield.Bitfield):  # 0xB0
+    alg = named[2:0]
+    fb = named[5:3]
+
+class PanBF(bitfield.Bitfield):  # 0xB4
+    pms = named[2:0]
+    ams = named[5:4]
+    pan = named[7:6]
+
+LFO = bitfield.compile(LfoBF)
+CH3_MODE = bitfield.compile(Ch3ModeBF)
+KEY_ON = bitfield.compile(KeyOnBF)
+DAC_ENABLE = bitfield.compile(DacEnableBF)
+ADDRESS = bitfield.compile(AddressBF)
+DT_MULT = bitfield.compile(DtMultBF)
+TL = bitfield.compile(TlBF)
+RS_AR = bitfield.compile(RsArBF)
+AM_DR = bitfield.compile(AmDrBF)
+SR = bitfield.compile(SrBF)
+SL_RR = bitfield.compile(SlRrBF)
+SSG = bitfield.compile(SsgBF)
+BLOCK_FREQ = bitfield.compile(BlockFreqBF)
+FB_ALG = bitfield.compile(FbAlgBF)
+PAN = bitfield.compile(PanBF)
+
+# SN76489
+
+class EventBF(bitfield.Bitfield):
+    is_action = named[7]
+    channel = named[6:5]
+    is_volume = named[4]
+    payload_l = named[3:0]
+    payload_h = named[5:0]
+
+PSG_EVENT = bitfield.compile(EventBF)
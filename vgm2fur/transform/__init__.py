@@ -1,4 +1,5 @@
-from .tabulate import tabulate, interpolate, merge
+from .tabulate import tabulate, interpolate, sample, changes, merge
+from .keyframes import Index, index_path, file_key, load_index, save_index
 from . import to_patterns_fm as fm
 from . import to_patterns_psg as psg
 from . import to_patterns_dac as dac
@@ -0,0 +1,130 @@
+"""Normalized VGM commands of the chip models, as records in parallel arrays."""
+import array
+from vgm2fur import chips, vgm
+from vgm2fur.vgm import records
+from vgm2fur.vgm.records import DataBlock
+
+# record kinds and their arguments
+FM = 0           # port << 8 | register, data
+PSG = 1          # 0, data
+WAIT = 2         # offset of the next command (0 if unknown), duration
+PLAY = 3         # 0, 0
+SET_POINTER = 4  # 0, pointer
+DATA_BLOCK = 5   # offset of the command (0 if unknown), index in `blocks`
+DAC_RUN = 6      # index in `runs`, total duration
+
+# records per chunk; chunks only end before a record which follows a wait
+CHUNK_SIZE = 0x4000
+
+class Stream:
+    def __init__(self):
+        self.kinds = array.array('B')
+        self.a = array.array('I')
+        self.b = array.array('I')
+        self.blocks = []
+        self.runs = []  # waits of DAC run steps
+
+    def __len__(self):
+        return len(self.kinds)
+
+    def __iter__(self):
+        return zip(self.kinds, self.a, self.b)
+
+    def append(self, kind, a, b):
+        self.kinds.append(kind)
+        self.a.append(a)
+        self.b.append(b)
+
+def _make_fm_filter():
+    """Registers whose rewrites with the same value are kept: frequency
+    registers (rewriting them moves the frequency latch), registers from 0xC0
+    and the fourth slot of channel registers, which no channel has. Other
+    rewrites are dropped unless the chip model reports them as ill-formed."""
+    keep = [False] * 0x200
+    for port in range(2):
+        for addr in range(0x100):
+            if addr >= 0xC0 or 0xA0 <= addr <= 0xAF:
+                keep[port << 8 | addr] = True
+            elif 0x30 <= addr <= 0x9F or 0xB0 <= addr <= 0xBF:
+                keep[port << 8 | addr] = addr & 3 == 3
+    return keep
+
+_FM_ALWAYS = _make_fm_filter()
+
+def normalize(events):
+    """Turns VGM events into a sequence of `Stream` chunks. Waits and data
+    blocks record their offsets if `events` is an `EventCursor`."""
+    fm_regs = [None] * 0x200
+    psg_vols = [None] * 4
+    psg_noise = None
+    stream = Stream()
+    wait = None  # duration of pending wait
+    step = False  # pending wait is the wait of a single DAC command
+    run = None  # waits of pending DAC run
+    for kind, a, b in vgm.decode_records(events):
+        if kind == records.DAC:
+            # a run starts after the first command with nonzero wait, since
+            # nothing but the sample length changes during the rest of it
+            if run is not None:
+                run.append(b)
+                run_wait += b
+                continue
+            if wait is not None:
+                stream.append(WAIT, offset, wait)
+                if step:
+                    run = array.array('B', [b])
+                    run_wait = b
+                    wait = None
+                    continue
+                wait = None
+            stream.append(PLAY, 0, 0)
+            if b > 0:
+                wait = b
+                step = True
+                offset = a
+            continue
+        if run is not None:
+            stream.append(DAC_RUN, len(stream.runs), run_wait)
+            stream.runs.append(run)
+            run = None
+        if kind == records.WAIT:
+            wait = b if wait is None else wait + b
+            step = False
+            offset = a
+            continue
+        if wait is not None:
+            stream.append(WAIT, offset, wait)
+            wait = None
+            if len(stream) >= CHUNK_SIZE:
+                yield stream
+                stream = Stream()
+        if kind == records.YM2612:
+            # every ill-formed write is reported, as without normalization
+            if (fm_regs[a] == b and not _FM_ALWAYS[a]
+                    and not chips.ym2612.ill_formed(a >> 8, a & 0xFF, b)):
+                continue
+            fm_regs[a] = b
+            stream.append(FM, a, b)
+        elif kind == records.SN76489:
+            if b & 0x90 == 0x90:
+                ch = (b >> 5) & 3
+                if psg_vols[ch] == b & 0x0F:
+                    continue
+                psg_vols[ch] = b & 0x0F
+            elif b & 0xF0 == 0xE0:
+                if psg_noise == b & 0x0F:
+                    continue
+                psg_noise = b & 0x0F
+            stream.append(PSG, 0, b)
+        elif kind == records.SET_POINTER:
+            stream.append(SET_POINTER, 0, b)
+        elif kind == records.DATA_BLOCK:
+            stream.append(DATA_BLOCK, a, len(stream.blocks))
+            stream.blocks.append(b)
+    if run is not None:
+        stream.append(DAC_RUN, len(stream.runs), run_wait)
+        stream.runs.append(run)
+    if wait is not None:
+        stream.append(WAIT, offset, wait)
+    if len(stream) > 0:
+        yield stream
@@ -0,0 +1,104 @@
+import array
+import bisect
+import copy
+import os
+from typing import NamedTuple, Any
+from vgm2fur import chips, vgm
+from vgm2fur.vgm import unpacker
+
+# bump whenever contents of keyframes or layout of index files change
+INDEX_VERSION = 6
+DEFAULT_INTERVAL = 10 * vgm.SAMPLE_RATE
+
+_MAGIC = b'VGM2FURi'
+# magic, version, file size, file mtime, latch, complete, interval,
+# keyframe count, data block count
+_HEADER = unpacker.compile('8sLQq??QQQ')
+# time, offset, data blocks before it; packed chip models follow
+_KEYFRAME = unpacker.compile('QQQ')
+
+class Keyframe(NamedTuple):
+    t: int
+    offset: int
+    fm: Any
+    psg: Any
+    dac: Any
+    datablocks: int
+
+class Index:
+    """Chip state keyframes of a song, taken every `interval` samples, and
+    offsets of its data blocks."""
+    def __init__(self, key=None, interval=DEFAULT_INTERVAL):
+        self.key = key
+        self.interval = interval
+        self.keyframes = []
+        self.datablocks = []
+        self.complete = False
+
+    def add(self, t, offset, fm, psg, dac):
+        if t < (len(self.keyframes) + 1) * self.interval:
+            return
+        self.keyframes.append(Keyframe(t, offset,
+            copy.deepcopy(fm), copy.deepcopy(psg), copy.deepcopy(dac),
+            len(self.datablocks)))
+
+    def add_datablock(self, offset):
+        self.datablocks.append(offset)
+
+    def find(self, t):
+        """Returns the last keyframe at or before `t`, or None."""
+        i = bisect.bisect_right(self.keyframes, t, key=lambda kf: kf.t)
+        return self.keyframes[i - 1] if i > 0 else None
+
+def index_path(filename):
+    return filename + '.idx'
+
+def file_key(filename, use_latch):
+    """Identifies the file contents and settings an index is valid for."""
+    st = os.stat(filename)
+    return (INDEX_VERSION, st.st_size, st.st_mtime_ns, use_latch)
+
+def load_index(path, key, *, offsets_only=False):
+    """Loads index from `path`; returns None if it's missing, out of date or
+    damaged. With `offsets_only`, any latch setting is accepted."""
+    try:
+        with open(path, 'rb') as f:
+            index = _parse(f.read())
+    except (OSError, ValueError, unpacker.NoDataError):
+        return None
+    if index is None:
+        return None
+    if index.key != key and not (offsets_only and index.key[:-1] == key[:-1]):
+        return None
+    return index
+
+def _parse(data):
+    unp = unpacker.Unpacker(data)
+    (magic, version, size, mtime, latch, complete,
+        interval, count, blockcount) = unp.unpack_struct(_HEADER)
+    if magic != _MAGIC or version != INDEX_VERSION or not complete:
+        return None
+    index = Index((version, size, mtime, latch), interval)
+    index.datablocks = unp.bytes(8 * blockcount).cast('Q').tolist()
+    for _ in range(count):
+        t, offset, datablocks = unp.unpack_struct(_KEYFRAME)
+        fm = chips.YM2612.unpack(unp.bytes(chips.YM2612.packed_size))
+        psg = chips.SN76489.unpack(unp.bytes(chips.SN76489.packed_size))
+        dac = chips.Sampler.unpack(unp.bytes(chips.Sampler.packed_size))
+        index.keyframes.append(Keyframe(t, offset, fm, psg, dac, datablocks))
+    if unp.left() != 0:
+        raise ValueError('trailing data in keyframe index file')
+    index.complete = True
+    return index
+
+def save_index(index, path):
+    version, size, mtime, latch = index.key
+    with open(path, 'wb') as f:
+        f.write(_HEADER.pack(_MAGIC, version, size, mtime, latch, index.complete,
+            index.interval, len(index.keyframes), len(index.datablocks)))
+        f.write(array.array('Q', index.datablocks).tobytes())
+        for kf in index.keyframes:
+            f.write(_KEYFRAME.pack(kf.t, kf.offset, kf.datablocks))
+            f.write(kf.fm.pack())
+            f.write(kf.psg.pack())
+            f.write(kf.dac.pack())
@@ -1,87 +1,234 @@
-from vgm2fur import chips
+import bisect
+import copy
+import fractions
+import heapq
+import itertools
+import math
+import operator
+import warnings
+from vgm2fur import chips, vgm
+from vgm2fur.vgm import records
+from . import ir
+from .ir import DataBlock
 from typing import NamedTuple, Any
 
 class TableEntry(NamedTuple):
     t: int
     chip: Any
 
-class DataBlock(NamedTuple):
-    type: int
-    data: bytes
-
-def _tabulate(events):
-    fm = chips.YM2612()
-    psg = chips.SN76489()
-    dac = chips.Sampler()
-    t = 0
-    table_fm = []
-    table_psg = []
-    table_dac = []
-    table_data = []
-    empty = True
-    for action in _events_to_actions(events):
-        match action:
-            case DataBlock():
-                table_data.append(action)
-            case FmWrite(port, addr, data):
-                fm.update(port, addr, data)
-            case PsgWrite(data):
-                psg.update(data)
-            case SetSamplePointer(ptr):
-                dac.set(ptr)
-            case PlaySample():
+def _warn(err):
+    warnings.warn(str(err))
+
+# chips which have models
+_MODELS = ('ym2612', 'sn76489', 'dac')
+
+def _init(keyframe, latch, names):
+    """Models of the chips in `names` (None for the others) and the time
+    they start at."""
+    fm = psg = dac = None
+    if keyframe is None:
+        if 'ym2612' in names: fm = chips.YM2612(latch=latch)
+        if 'sn76489' in names: psg = chips.SN76489()
+        if 'dac' in names: dac = chips.Sampler()
+        return fm, psg, dac, 0
+    if 'ym2612' in names: fm = copy.deepcopy(keyframe.fm)
+    if 'sn76489' in names: psg = copy.deepcopy(keyframe.psg)
+    if 'dac' in names: dac = copy.deepcopy(keyframe.dac)
+    return fm, psg, dac, keyframe.t
+
+def _keys(keys):
+    if keys is None:
+        return None, None, None
+    return keys.get('ym2612'), keys.get('sn76489'), keys.get('dac')
+
+def _states(events, *, names=_MODELS, keyframe=None, data, end=None, index=None, latch=False,
+        keys=None, diagnostics=None):
+    """Yields `(t, states)` whenever time advances to `t`, where `states` are
+    the chip states sampled at the last wait; the tuple is the same object
+    until one of them changes. Data blocks are appended to `data`. After
+    `end`, the rest of the song only goes to the DAC model."""
+    report = _warn if diagnostics is None else diagnostics.append
+    fm, psg, dac, t = _init(keyframe, latch, names)
+    key_fm, key_psg, key_dac = _keys(keys)
+    states = None
+    fm_state = psg_state = dac_state = None
+    fm_gen = psg_gen = dac_gen = None
+    fm_key = psg_key = dac_key = None
+    streams = ir.normalize(events)
+    for stream in streams:
+        records = iter(stream)
+        for kind, a, b in records:
+            match kind:
+                case ir.FM:
+                    try:
+                        fm.update(a >> 8, a & 0xFF, b)
+                    except chips.ym2612.IllFormedEvent as err:
+                        report(err)
+                case ir.PSG:
+                    psg.update(b)
+                case ir.SET_POINTER:
+                    dac.set(b)
+                case ir.PLAY:
+                    if dac is not None:
+                        dac.play()
+                case ir.DAC_RUN:
+                    if dac is not None:
+                        dac.play_run(stream.runs[a])
+                    t += b
+                    yield t, states
+                    if end is not None and t >= end:
+                        _rest(stream, records, streams, dac, data)
+                        return
+                case ir.DATA_BLOCK:
+                    data.append(stream.blocks[b])
+                    if index is not None:
+                        index.add_datablock(a)
+                case ir.WAIT:
+                    if fm is not None and fm.generation != fm_gen:
+                        fm_gen = fm.generation
+                        if key_fm is None or fm_key != (fm_key := key_fm(fm)):
+                            fm_state = fm.copy()
+                            states = None
+                    if psg is not None and psg.generation != psg_gen:
+                        psg_gen = psg.generation
+                        if key_psg is None or psg_key != (psg_key := key_psg(psg)):
+                            psg_state = psg.copy()
+                            states = None
+                    if dac is not None:
+                        if dac.generation != dac_gen:
+                            dac_gen = dac.generation
+                            if key_dac is None or dac_key != (dac_key := key_dac(dac)):
+                                dac_state = dac.copy()
+                                states = None
+                        dac.wait(b)
+                    if states is None:
+                        states = (fm_state, psg_state, dac_state)
+                    t += b
+                    yield t, states
+                    if end is not None and t >= end:
+                        _rest(stream, records, streams, dac, data)
+                        return
+                    if index is not None:
+                        index.add(t, a, fm, psg, dac)
+    if index is not None:
+        index.complete = True
+
+def _rest(stream, records, streams, dac, data):
+    """Feeds the rest of the song to `dac` and appends its data blocks to
+    `data`: later plays still lengthen the sample the last state holds."""
+    while True:
+        for kind, a, b in records:
+            if kind == ir.DATA_BLOCK:
+                data.append(stream.blocks[b])
+            elif dac is None:
+                continue
+            elif kind == ir.WAIT:
+                dac.wait(b)
+            elif kind == ir.PLAY:
                 dac.play()
-            case Wait(delta_t) if empty:
-                empty = False
-                table_fm.append(TableEntry(t, fm.copy()))
-                table_psg.append(TableEntry(t, psg.copy()))
-                table_dac.append(TableEntry(t, dac.copy()))
-                t += delta_t
-                dac.wait(delta_t)
-            case Wait(delta_t):
-                if table_fm[-1].chip != fm:
-                    table_fm.append(TableEntry(t, fm.copy()))
-                if table_psg[-1].chip != psg:
-                    table_psg.append(TableEntry(t, psg.copy()))
-                if table_dac[-1].chip != dac:
-                    table_dac.append(TableEntry(t, dac.copy()))
-                t += delta_t
-                dac.wait(delta_t)
-    return table_fm, table_psg, table_dac, table_data
-
-def _find_index(t, i, table):
-    while i < len(table) - 1 and not (table[i].t <= t and t < table[i+1].t):
-        i += 1
-    return i
+            elif kind == ir.DAC_RUN:
+                dac.play_run(stream.runs[a])
+            elif kind == ir.SET_POINTER:
+                dac.set(b)
+        stream = next(streams, None)
+        if stream is None:
+            return
+        records = iter(stream)
+
+def _tabulate(events, *, keyframe=None, end=None, index=None, **kwargs):
+    """Chip state tables: a `TableEntry` for every state `_states` samples
+    before `end`, at the time it's sampled at."""
+    tables = ([], [], [])
+    t = 0 if keyframe is None else keyframe.t
+    last = (None, None, None)
+    # an index being filled still gets the rest of the song past `end`
+    states = _states(events, keyframe=keyframe, end=end if index is None else None,
+        index=index, **kwargs)
+    for t_next, states in states:
+        if end is not None and t >= end:
+            t = t_next
+            continue
+        if states is not last and states is not None:
+            for table, old, new in zip(tables, last, states):
+                if new is not old:
+                    table.append(TableEntry(t, new))
+            last = states
+        t = t_next
+    return tables
 
 class TableInterp:
     def __init__(self, table):
         self.table = table
+        self.times = [entry.t for entry in table]
         self.i = 0
-    def __contains__(self, t):
-        curr = self.table[self.i]
-        next = self.table[self.i + 1]
-        return curr.t <= t and t < next.t
     def interpolate(self, t):
-        while self.i < len(self.table) - 1 and t not in self:
-            self.i += 1
-        return self.table[self.i].chip
+        """Returns the last state at or before `t`, which must not decrease
+        between calls."""
+        self.i = bisect.bisect_right(self.times, t, lo=self.i)
+        return self.table[max(self.i - 1, 0)].chip
+
+def _exact(x):
+    # floats are taken as the decimals they print as, e.g. 735.3 rather
+    # than the binary fraction slightly below it
+    return fractions.Fraction(repr(x)) if isinstance(x, float) else fractions.Fraction(x)
+
+def _row_times(t_end, period, start):
+    """Sample times of rows, rounded down: `start + k * period` for every
+    row `k` before `t_end`, computed exactly."""
+    start = _exact(start)
+    period = _exact(period)
+    d = math.lcm(start.denominator, period.denominator)
+    a = start.numerator * (d // start.denominator)
+    b = period.numerator * (d // period.denominator)
+    rows = math.ceil((t_end - start) / period)
+    return ((a + k * b) // d for k in range(max(rows, 0)))
 
 def _interpolate(tables, t_end, period, start):
     assert period > 0
-    tablecount = len(tables)
-    dectables = tuple([] for _ in range(tablecount))
-    interps = tuple(TableInterp(table) for table in tables) 
-    t = start
-    while t < t_end:
-        for i in range(tablecount):
-            dectables[i].append(interps[i].interpolate(t))
-        t += period
-    return dectables
-
-def tabulate(events, /, *, chips):
-    events = events(*chips)
-    fm, psg, dac, data = _tabulate(events)
+    times = list(_row_times(t_end, period, start))
+    dectables = []
+    for table in tables:
+        interp = TableInterp(table)
+        dectables.append([interp.interpolate(t) for t in times])
+    return tuple(dectables)
+
+def _datablocks(events, start, count):
+    """First `count` data blocks of `events('data')` from offset `start`,
+    read in one pass."""
+    decoded = vgm.decode_records(events('data', start=start))
+    blocks = (b for kind, _, b in decoded if kind == records.DATA_BLOCK)
+    res = list(itertools.islice(blocks, count))
+    decoded.close()
+    return res
+
+def _open(events, chips, start, index):
+    """Opens `events(*chips)` at the keyframe of a complete `index` nearest to
+    `start`; returns events, chips, keyframe, its data blocks and `index` to fill."""
+    keyframe = None
+    datablocks = []
+    if index is not None:
+        # the index must know about every data block, whatever is tabulated,
+        # and keyframes being added must hold every chip
+        chips = [*chips, 'data'] if index.complete else [*_MODELS, 'data']
+        if index.complete:
+            keyframe = index.find(start)
+            if keyframe is not None and keyframe.datablocks > 0:
+                datablocks = _datablocks(events, index.datablocks[0], keyframe.datablocks)
+            index = None
+    if keyframe is None:
+        events = events(*chips)
+    else:
+        events = events(*chips, start=keyframe.offset)
+    return events, chips, keyframe, datablocks, index
+
+def tabulate(events, /, *, chips, start=0, end=None, index=None, latch=False, keys=None,
+        diagnostics=None):
+    """Builds chip state tables from `events(*chips)`, resuming from a keyframe
+    of a complete `index` or filling an incomplete one."""
+    events, names, keyframe, datablocks, index = _open(events, chips, start, index)
+    data = list(datablocks)
+    fm, psg, dac = _tabulate(events, names=names, keyframe=keyframe, data=data, end=end,
+        index=index, latch=latch, keys=keys, diagnostics=diagnostics)
     res = []
     for chip in chips:
         match chip:
@@ -93,95 +240,93 @@ def tabulate(events, /, *, chips):
 def interpolate(tables, /, *, length, period, skip):
     return _interpolate(tables, length, period, skip)
 
-class Cursor:
-    def __init__(self, table, key):
-        self.table = table
-        self.index = 0
-        self._key = key
-    @property
-    def value(self):
-        if self.end:
-            return self.table[-1]
-        return self.table[self.index]
-    @property
-    def end(self):
-        return self.index >= len(self.table)
-    def key(self):
-        if self.end:
-            return Infinity()
-        return self._key(self)
-
-class Infinity:
-    def __lt__(self, other):
-        return False
+def _tagged(i, table):
+    for entry in table:
+        yield entry.t, i, entry.chip
 
 def merge(tables):
-    mtable = tuple([] for _ in range(len(tables)))
-    cursors = (Cursor(table, key=lambda cur: cur.value.t) for i, table in enumerate(tables))
-    while any(not cursor.end for cursor in cursor):
-        t = min(cursors, key=Cursor.key).value.t
-        mtable[0].append(t)
-        for i, cursor in enumerate(cursor):
-            mtable[i+1].append(cursor.value)
-            if cursor.value.t == t:
-                cursor.index += 1
-    return mtable
-
-class FmWrite:
-    __match_args__ = ('port', 'addr', 'data')
-    def __init__(self, port, addr, data):
-        self.port = port
-        self.addr = addr
-        self.data = data
-
-class PsgWrite:
-    __match_args__ = ('data', )
-    def __init__(self, data):
-        self.data = data
-
-class Wait:
-    __match_args__ = ('wait', )
-    def __init__(self, wait):
-        self.wait = wait
-
-class PlaySample:
-    pass
-
-class SetSamplePointer:
-    __match_args__ = ('ptr', )
-    def __init__(self, ptr):
-        self.ptr = ptr
-
-class Unknown:
-    __match_args__ = ('event', )
-    def __init__(self, event):
-        self.event = event
-
-def _events_to_actions(events):
-    for event in events:
-        match event:
-            case (0x52, addr, data):
-                yield FmWrite(0, addr, data)
-            case (0x53, addr, data):
-                yield FmWrite(1, addr, data)
-            case (0x50, data):
-                yield PsgWrite(data)
-            case (0x61, wait):
-                yield Wait(wait)
-            case (0x62,):
-                yield Wait(735)
-            case (0x63,):
-                yield Wait(882)
-            case (x,) if 0x70 <= x and x <= 0x7F:
-                yield Wait(event[0] - 0x70 + 1)
-            case (0x80,):
-                yield PlaySample()
-            case (x,) if 0x81 <= x and x <= 0x8F:
-                yield PlaySample()
-                yield Wait(event[0] - 0x80)
-            case (0xE0, addr):
-                yield SetSamplePointer(addr)
-            case (0x67, type, data):
-                yield DataBlock(type, data)
-            case _:
-                yield Unknown(event)
+    """Merges state tables lazily into rows `(t, state, ...)`: one for every
+    time at which any state changes, with the last state of every table at
+    or before `t` (None before its first entry)."""
+    current = [None] * len(tables)
+    entries = heapq.merge(
+        *(_tagged(i, table) for i, table in enumerate(tables)),
+        key=operator.itemgetter(0))
+    for t, group in itertools.groupby(entries, key=operator.itemgetter(0)):
+        for _, i, chip in group:
+            current[i] = chip
+        yield (t, *current)
+
+def _changes(states, t, select, end):
+    last = (None, None, None)
+    # DAC states keep growing with later plays until a new one is taken, so
+    # rows holding the latest one are held back
+    pending = [] if 2 in select else None
+    for t_next, states in states:
+        # an index being filled still gets the rest of the song past `end`
+        if end is not None and t >= end:
+            t = t_next
+            continue
+        if states is not None and any(states[i] is not last[i] for i in select):
+            row = (t, *(states[i] for i in select))
+            if pending is None:
+                yield row
+            else:
+                if states[2] is not last[2]:
+                    yield from pending
+                    pending.clear()
+                pending.append(row)
+            last = states
+        t = t_next
+    if pending is not None:
+        yield from pending
+
+def changes(events, /, *, chips, start=0, end=None, index=None, latch=False, keys=None,
+        diagnostics=None):
+    """Rows of `merge` over the tables `tabulate` would build, in one pass;
+    returns an iterator over rows and data blocks."""
+    events, names, keyframe, datablocks, index = _open(events, chips, start, index)
+    data = list(datablocks)
+    states = _states(events, names=names, keyframe=keyframe, data=data,
+        end=end if index is None else None, index=index, latch=latch, keys=keys,
+        diagnostics=diagnostics)
+    t = 0 if keyframe is None else keyframe.t
+    return _changes(states, t, _select(chips), end), data
+
+def _select(chips):
+    """Positions of `chips` in the states `_states` yields."""
+    select = []
+    for chip in chips:
+        match chip:
+            case 'ym2612': select.append(0)
+            case 'sn76489': select.append(1)
+            case 'dac': select.append(2)
+    return select
+
+def _sample(states, times, select):
+    t_row = next(times, None)
+    last = None
+    # states are read to the end even after the last row, since they still
+    # lengthen its DAC sample and collect data blocks
+    for t, last in states:
+        while t_row is not None and t_row < t:
+            yield tuple(last[i] for i in select)
+            t_row = next(times, None)
+    if last is None:
+        return
+    while t_row is not None:
+        yield tuple(last[i] for i in select)
+        t_row = next(times, None)
+
+def sample(events, /, *, chips, length, period, skip=0, index=None, latch=False, keys=None,
+        diagnostics=None):
+    """Samples chip states at rows of `period` samples, as `tabulate` and
+    `interpolate` would; returns an iterator over rows and data blocks."""
+    assert period > 0
+    events, names, keyframe, datablocks, index = _open(events, chips, skip, index)
+    data = list(datablocks)
+    states = _states(events, names=names, keyframe=keyframe, data=data,
+        end=length if index is None else None, index=index, latch=latch, keys=keys,
+        diagnostics=diagnostics)
+    times = _row_times(length, period, skip)
+    return _sample(states, times, _select(chips)), data
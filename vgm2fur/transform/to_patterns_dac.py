@@ -2,7 +2,7 @@ from typing import NamedTuple
 from math import ceil
 from .tabulate import DataBlock
 from vgm2fur import AppError as Vgm2FurError
-from vgm2fur import bitfield, furnace
+from vgm2fur import furnace
 
 class YM2612DAC:
     def __init__(self, data):
@@ -187,12 +187,13 @@ def _decode_dpcm(enc, bc, bd, start, map):
     return dec
 
 def _bitstream(enc, bc):
-    n = bitfield.make(0)
+    n = 0
     bits = 0
+    mask = (1 << bc) - 1
     for x in enc:
-        n.all = (n.all << 8) + x
+        n = (n << 8) + x
         bits += 8
         while bits >= bc:
-            yield n[bits : bits-bc+1]
+            yield (n >> (bits - bc + 1)) & mask
             bits -= bc
-            n.all = n[bits : 0]
+            n &= (1 << (bits + 1)) - 1
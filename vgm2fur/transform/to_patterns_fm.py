@@ -1,23 +1,24 @@
 from typing import NamedTuple
 import bisect
-from vgm2fur import furnace, bitfield
+from vgm2fur import furnace
+from vgm2fur.chips import ym2612
 from vgm2fur import AppError as Vgm2FurError
 
 def prepare(chip):
-    fm1, fm2, fm3, fm4, fm5, fm6 = _split_fm(chip)
-    if _has_csm(fm3):
+    states, rows = _distinct(chip)
+    if any(fm.ch3_mode == 2 for fm in states):
         raise CsmNotSupported()
 
-    fm1 = list(map(_to_key_voice_lfo, fm1))
-    fm2 = list(map(_to_key_voice, fm2))
-    fm4 = list(map(_to_key_voice, fm4))
-    fm5 = list(map(_to_key_voice, fm5))
-    fm6 = list(map(_to_key_voice_dac, fm6))
+    fm1 = _gather(_to_key_voice_lfo, states, rows, 0)
+    fm2 = _gather(_to_key_voice, states, rows, 1)
+    fm4 = _gather(_to_key_voice, states, rows, 3)
+    fm5 = _gather(_to_key_voice, states, rows, 4)
+    fm6 = _gather(_to_key_voice_dac, states, rows, 5)
 
-    if _has_special_mode(fm3):
-        fm3 = list(_to_4key_voice_ch3(fm3))
+    if any(fm.ch3_mode == 1 for fm in states):
+        fm3 = list(_to_4key_voice_ch3(fm.channels[2] for fm in chip))
     else:
-        fm3 = list(map(_to_key_voice, fm3))
+        fm3 = _gather(_to_key_voice, states, rows, 2)
 
     return fm1, fm2, fm3, fm4, fm5, fm6
 
@@ -141,18 +142,35 @@ def _find_best_note_bisect(freq, freq_map):
         candidates = [(note_l, diff_l), (note_c, diff_c), (note_r, diff_r)]
     return min(candidates, key=lambda x: abs(x[1]))
 
-def _split_fm(fmtable):
-    chs = tuple(list() for _ in range(6))
-    for fm in fmtable:
-        for i in range(6):
-            chs[i].append(fm.channels[i])
-    return chs
-
-def _has_special_mode(fm3):
-    return any(cs.mode == 1 for cs in fm3)
-
-def _has_csm(fm3):
-    return any(cs.mode == 2 for cs in fm3)
+def _distinct(chip):
+    """Splits sampled states into the distinct state objects and the index
+    of the state of every row."""
+    index = {}
+    states = []
+    rows = []
+    last = None
+    for fm in chip:
+        if fm is not last:
+            last = fm
+            i = index.get(id(fm))
+            if i is None:
+                i = index[id(fm)] = len(states)
+                states.append(fm)
+        rows.append(i)
+    return states, rows
+
+def _gather(func, states, rows, num):
+    """`func` of channel `num` of the state of every row, called once for
+    every distinct channel state."""
+    results = {}
+    mapped = []
+    for fm in states:
+        key = ym2612.channel_key(fm, num)
+        x = results.get(key)
+        if x is None:
+            x = results[key] = func(ym2612.channel(fm, num))
+        mapped.append(x)
+    return [mapped[i] for i in rows]
 
 class Key(NamedTuple):
     note: int
@@ -178,8 +196,8 @@ def _to_4key_voice_ch3(chs):
     keyid_prev = [0, 0, 0, 0]
     for ch in chs:
         keys = [None] * 4
-        opmask = bitfield.make(ch.opmask)
-        if opmask.all == 0:
+        opmask = [ch.opmask >> i & 1 for i in range(4)]
+        if ch.opmask == 0:
             keyid = ch.keyid
             for i in range(4):
                 keys[i] = Key(note=furnace.notes.Off, disp=0, vol=0, id=keyid, pan=ch.pan)
@@ -238,24 +256,14 @@ def _to_key_voice_lfo(ch1):
     return key, voice, lfo
 
 def _extract_voice(ch):
-    op1 = ch.op(1)
-    op2 = ch.op(2)
-    op3 = ch.op(3)
-    op4 = ch.op(4)
+    # operator fields are declared in the order of `FMOp` fields
+    FMOp = furnace.instr.FMOp
     return furnace.instr.FMVoice(
         ch3=False, alg=ch.alg, fb=ch.fb, pms=ch.pms, ams=ch.ams, op=(
-            furnace.instr.FMOp(mult=op1.mult, dt=op1.dt, tl=op1.tl, ar=op1.ar,
-                rs=op1.rs, dr=op1.dr, am=op1.am, sr=op1.sr, rr=op1.rr, sl=op1.sl,
-                ssg=op1.ssg, ssg_en=op1.ssg_en),
-            furnace.instr.FMOp(mult=op2.mult, dt=op2.dt, tl=op2.tl, ar=op2.ar,
-                rs=op2.rs, dr=op2.dr, am=op2.am, sr=op2.sr, rr=op2.rr, sl=op2.sl,
-                ssg=op2.ssg, ssg_en=op2.ssg_en),
-            furnace.instr.FMOp(mult=op3.mult, dt=op3.dt, tl=op3.tl, ar=op3.ar,
-                rs=op3.rs, dr=op3.dr, am=op3.am, sr=op3.sr, rr=op3.rr, sl=op3.sl,
-                ssg=op3.ssg, ssg_en=op3.ssg_en),
-            furnace.instr.FMOp(mult=op4.mult, dt=op4.dt, tl=op4.tl, ar=op4.ar,
-                rs=op4.rs, dr=op4.dr, am=op4.am, sr=op4.sr, rr=op4.rr, sl=op4.sl,
-                ssg=op4.ssg, ssg_en=op4.ssg_en)))
+            FMOp._make(ch.op(1).values()),
+            FMOp._make(ch.op(2).values()),
+            FMOp._make(ch.op(3).values()),
+            FMOp._make(ch.op(4).values())))
 
 def _normalize_voice(voice):
     match voice.alg:
@@ -2,11 +2,15 @@ import bisect
 from vgm2fur import furnace
 
 def prepare(chip):
-    noted = list(map(_find_best_notes, chip))
-    psg1 = _channel_data(noted, 0)
-    psg2 = _channel_data(noted, 1)
-    psg3 = _channel_data(noted, 2)
-    noise = _channel_data(noted, 3)
+    # states are read field by field, as columns; notes of frequencies are
+    # looked up in a table of all of them
+    columns = list(zip(*chip)) if len(chip) > 0 else [()] * 8
+    freq1, vol1, freq2, vol2, freq3, vol3, noise_mode, noise_vol = columns
+    notes1, notes2, notes3 = ([_NOTES[freq] for freq in freqs] for freqs in (freq1, freq2, freq3))
+    psg1 = _tonal_data(notes1, vol1)
+    psg2 = _tonal_data(notes2, vol2)
+    psg3 = _tonal_data(notes3, vol3)
+    noise = [(n, d, v, m) for (n, d), v, m in zip(notes3, noise_vol, noise_mode)]
     return psg1, psg2, psg3, noise
 
 def to_patterns(chdata, /, *, channel=''):
@@ -67,22 +71,11 @@ def _find_best_note(freq):
         candidates = [(note_l, diff_l), (note_c, diff_c), (note_r, diff_r)]
     return min(candidates, key=lambda x: abs(x[1]))
 
-def _find_best_notes(psg):
-    n1, d1 = _find_best_note(psg.tonal[0].freq)
-    v1 = psg.tonal[0].vol
-    n2, d2 = _find_best_note(psg.tonal[1].freq)
-    v2 = psg.tonal[1].vol
-    n3, d3 = _find_best_note(psg.tonal[2].freq)
-    v3 = psg.tonal[2].vol
-    mn = psg.noise.mode
-    vn = psg.noise.vol
-    return ((n1, d1, v1), (n2, d2, v2), (n3, d3, v3), (mn, vn))
-
-def _channel_data(notetable, channel):
-    if 0 <= channel and channel < 3:
-        return [x[channel] for x in notetable]
-    elif channel == 3:
-        return [(n, d, v, m) for (_, _, (n, d, _), (m, v)) in notetable]
+# notes of all 10-bit frequencies
+_NOTES = [_find_best_note(freq) for freq in range(0x400)]
+
+def _tonal_data(notes, vols):
+    return [(n, d, v) for (n, d), v in zip(notes, vols)]
 
 def _fx_pitch(delta):
     if delta > 0:
@@ -1,3 +1,8 @@
-from .song import load, Song, BadVgmFile, UnknownCommand, events_csv
+from .song import load, Song, Loop, BadVgmFile, TruncatedVgmFile, UnknownCommand, events_csv
+from .columnar import decode_columnar, write_npz, Columns
+from .parallel import parallel_events
+from .feed import Parser, PipeSong
+from .cache import cached, CachedSong
+from .records import decode_records, DataBlock
 
 SAMPLE_RATE = 44100
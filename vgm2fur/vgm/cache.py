@@ -0,0 +1,190 @@
+import array
+import contextlib
+import hashlib
+import mmap
+import os
+import warnings
+from . import unpacker
+from .song import Song, _COM_TABLES, _chip_comset, _NOPARAMS, _UNPACK
+
+# bump whenever decoding of events or layout of cache files changes
+CACHE_VERSION = 1
+DEFAULT_LIMIT = 1 << 30
+
+_MAGIC = b'VGM2FURc'
+# magic, version, event count, parameter count, payload size
+_HEADER = unpacker.compile('8sLQQQ')
+_HEADER_AREA = 64
+_SUFFIX = '.evc'
+_DIGEST_CHUNK = 1 << 20
+
+def default_dir():
+    base = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(base, 'vgm2fur')
+
+def cached(song, filename, *, directory=None, limit=DEFAULT_LIMIT):
+    """Wraps `song` loaded from `filename` so that its events are read from
+    the event cache in `directory`, or decoded once and stored there."""
+    if directory is None:
+        directory = default_dir()
+    digest = _file_digest(filename)
+    path = os.path.join(directory, f'{digest}-{CACHE_VERSION}{_SUFFIX}')
+    return CachedSong(song, path, limit)
+
+def _file_digest(filename):
+    h = hashlib.blake2b()
+    with open(filename, 'rb') as f:
+        while chunk := f.read(_DIGEST_CHUNK):
+            h.update(chunk)
+    return h.hexdigest()[:32]
+
+class CachedSong(Song):
+    """Song whose events are read from a memory-mapped file of decoded events.
+    Offsets given to `events` and `cursor` refer to the original song."""
+    def __init__(self, song, path, limit):
+        self.name = song.name
+        self.header = song.header
+        self._song = song
+        self._path = path
+        self._limit = limit
+        self._columns = None
+
+    def _unpacker(self):
+        return self._song._unpacker()
+
+    def read(self):
+        return self._song.read()
+
+    def events(self, *chiplist, start=None):
+        if start is not None:
+            return self._song.events(*chiplist, start=start)
+        if self._columns is None:
+            self._columns = self._load() or self._store()
+        return _replay(*self._columns, _arities(self.version), _chip_comset(chiplist))
+
+    def _load(self):
+        try:
+            with open(self._path, 'rb') as f:
+                data = memoryview(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+            columns = _split(data)
+        except (OSError, ValueError, unpacker.NoDataError):
+            return None
+        try:
+            # keeps recently used files from being evicted
+            os.utime(self._path)
+        except OSError:
+            pass
+        return columns
+
+    def _store(self):
+        coms = bytearray()
+        params = array.array('I')
+        payloads = bytearray()
+        for event in self._song.events():
+            com = event[0]
+            coms.append(com)
+            if com == 0x67:
+                params.extend((event[1], len(payloads), len(event[2])))
+                payloads += event[2]
+            else:
+                params.extend(event[1:])
+        try:
+            _write(self._path, coms, params, payloads)
+            _evict(os.path.dirname(self._path), self._limit, keep=self._path)
+        except OSError as err:
+            warnings.warn(f'cannot write event cache "{self._path}": {err.strerror}')
+        return memoryview(coms), memoryview(params), memoryview(payloads)
+
+def _layout(count, paramcount):
+    """Offsets of parameters and payloads in a cache file."""
+    params = _HEADER_AREA + count
+    params += -params % 4
+    return params, params + 4 * paramcount
+
+def _write(path, coms, params, payloads):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    header = _HEADER.pack(_MAGIC, CACHE_VERSION, len(coms), len(params), len(payloads))
+    params_start, _ = _layout(len(coms), len(params))
+    tmp = f'{path}.{os.getpid()}.tmp'
+    try:
+        with open(tmp, 'wb') as f:
+            f.write(header.ljust(_HEADER_AREA, b'\0'))
+            f.write(coms)
+            f.write(bytes(params_start - _HEADER_AREA - len(coms)))
+            params.tofile(f)
+            f.write(payloads)
+        os.replace(tmp, path)
+    except OSError:
+        with contextlib.suppress(OSError):
+            os.remove(tmp)
+        raise
+
+def _split(data):
+    unp = unpacker.Unpacker(data)
+    magic, version, count, paramcount, size = unp.unpack_struct(_HEADER)
+    if magic != _MAGIC or version != CACHE_VERSION:
+        raise ValueError('not an event cache file')
+    params, payloads = _layout(count, paramcount)
+    if len(data) != payloads + size:
+        raise ValueError('truncated event cache file')
+    return (data[_HEADER_AREA : _HEADER_AREA + count],
+        data[params:payloads].cast('I'),
+        data[payloads:])
+
+def _evict(directory, limit, *, keep):
+    """Removes least recently used cache files until their total size fits
+    in `limit` bytes."""
+    entries = []
+    for entry in os.scandir(directory):
+        if entry.name.endswith(_SUFFIX) and entry.path != keep:
+            st = entry.stat()
+            entries.append((st.st_mtime, st.st_size, entry.path))
+    total = sum(size for (_, size, _) in entries) + os.stat(keep).st_size
+    for (_, size, path) in sorted(entries):
+        if total <= limit:
+            break
+        with contextlib.suppress(OSError):
+            os.remove(path)
+        total -= size
+
+def _make_arities(table):
+    arities = []
+    for com, (kind, arg) in enumerate(table):
+        if kind == _NOPARAMS:
+            arities.append(0)
+        elif kind == _UNPACK:
+            arities.append(len(arg.unpack(bytes(arg.size))))
+        elif com == 0x67:
+            arities.append(3)  # type, payload offset, payload length
+        elif com == 0x68:
+            arities.append(4)
+        else:
+            arities.append(0)
+    return tuple(arities)
+
+_ARITIES = tuple(map(_make_arities, _COM_TABLES))
+
+def _arities(version):
+    return _ARITIES[version >= 0x160]
+
+_SINGLES = tuple((com,) for com in range(256))
+
+def _replay(coms, params, payloads, arities, comset):
+    i = 0
+    for com in coms:
+        n = arities[com]
+        if comset is not None and com not in comset:
+            i += n
+            continue
+        if n == 0:
+            yield _SINGLES[com]
+        elif n == 2:
+            yield (com, params[i], params[i+1])
+        elif n == 1:
+            yield (com, params[i])
+        elif com == 0x67:
+            type, offset, length = params[i : i+3]
+            yield (com, type, payloads[offset : offset+length])
+        else:
+            yield (com, *params[i : i+n])
+        i += n
@@ -0,0 +1,113 @@
+import array
+import sys
+import zipfile
+from typing import NamedTuple
+from .song import (_events, _chip_comset, _seek_vgm_data_start, _reporting_truncation,
+    _com_lengths, _PCM_WRITE_LENGTH)
+
+class Columns(NamedTuple):
+    """Decoded VGM events stored as parallel arrays, one element per event.
+
+    - `time`: absolute time of the event, in samples;
+    - `com`: command byte;
+    - `port`: chip port of register writes (0 for single-port chips), -1 otherwise;
+    - `addr`: register address of register writes, -1 otherwise;
+    - `data`: written value of register writes, duration of waits, pointer of
+      0xE0 commands, payload length of data blocks; -1 otherwise;
+    - `offset`: file offset of the command parameters (of the payload for data
+      blocks)."""
+    time: array.array
+    com: array.array
+    port: array.array
+    addr: array.array
+    data: array.array
+    offset: array.array
+
+def _make_wait_table():
+    waits = [0] * 256
+    waits[0x62] = 735
+    waits[0x63] = 882
+    for com in range(0x70, 0x80):
+        waits[com] = com - 0x70 + 1
+    for com in range(0x80, 0x90):
+        waits[com] = com - 0x80
+    return waits
+
+_WAITS = _make_wait_table()
+# YM2612, YM2608, YM2610 and YMF262 port 1 writes
+_SECOND_PORT = frozenset([0x53, 0x57, 0x59, 0x5F])
+
+def decode_columnar(song, *chiplist):
+    comset = _chip_comset(chiplist)
+    lengths = _com_lengths(song.version)
+    cols = Columns(
+        time=array.array('Q'),
+        com=array.array('B'),
+        port=array.array('b'),
+        addr=array.array('h'),
+        data=array.array('q'),
+        offset=array.array('Q'))
+    t = 0
+    with song._unpacker() as unp, _reporting_truncation(song.name):
+        _seek_vgm_data_start(unp)
+        # other commands are skipped by their length without being unpacked;
+        # waits are always kept, so times stay right
+        for event in _events(unp, song.version, comset):
+            end = unp.offset
+            com = event[0]
+            wait = _WAITS[com]
+            port = -1
+            addr = -1
+            data = -1
+            offset = end - lengths[com] + 1
+            match event:
+                case (0x50, d):
+                    port = 0
+                    data = d
+                case (0x61, d):
+                    wait = d
+                    data = d
+                case (0x67, _, payload):
+                    data = len(payload)
+                    offset = end - data
+                case (0x68, *_):
+                    offset = end - _PCM_WRITE_LENGTH + 1
+                case (0xE0, d):
+                    data = d
+                case (x, a, d) if 0x51 <= x and x <= 0x5F:
+                    port = 1 if x in _SECOND_PORT else 0
+                    addr = a
+                    data = d
+                case (x,) if wait > 0:
+                    data = wait
+            cols.time.append(t)
+            cols.com.append(com)
+            cols.port.append(port)
+            cols.addr.append(addr)
+            cols.data.append(data)
+            cols.offset.append(offset)
+            t += wait
+    return cols
+
+_NPY_KINDS = {'b': 'i', 'h': 'i', 'i': 'i', 'l': 'i', 'q': 'i',
+    'B': 'u', 'H': 'u', 'I': 'u', 'L': 'u', 'Q': 'u'}
+
+def _npy_header(arr):
+    byteorder = '<' if sys.byteorder == 'little' else '>'
+    if arr.itemsize == 1:
+        byteorder = '|'
+    descr = f'{byteorder}{_NPY_KINDS[arr.typecode]}{arr.itemsize}'
+    header = f"{{'descr': '{descr}', 'fortran_order': False, 'shape': ({len(arr)},), }}"
+    # magic (6) + version (2) + header length (2) + header + newline,
+    # padded to a multiple of 64 bytes
+    padding = -(10 + len(header) + 1) % 64
+    header = (header + ' ' * padding + '\n').encode('latin1')
+    return b'\x93NUMPY\x01\x00' + len(header).to_bytes(2, 'little') + header
+
+def write_npz(columns, file):
+    """Writes columns to `file` in NumPy `.npz` format (one array per column)."""
+    with zipfile.ZipFile(file, 'w') as npz:
+        for name, arr in zip(columns._fields, columns):
+            with npz.open(f'{name}.npy', 'w') as f:
+                f.write(_npy_header(arr))
+                f.write(memoryview(arr))
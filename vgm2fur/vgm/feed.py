@@ -0,0 +1,189 @@
+import zlib
+from . import unpacker
+from .song import (Song, BadVgmFile, TruncatedVgmFile, _events, _chip_comset,
+    _seek_vgm_data_start, _HEADER_SIZE, _GZIP_MAGIC, _DATA_BLOCK_HEADER_LENGTH)
+
+# enough to locate the start of VGM data
+_MIN_HEADER_SIZE = 0x40
+
+class Parser:
+    """Incremental VGM parser: data is pushed with `feed`, and `events` yields
+    the commands which have been received completely."""
+    def __init__(self, *chiplist):
+        self.comset = _chip_comset(chiplist)
+        self.header = None
+        self.done = False
+        self._buf = bytearray()
+        self._offset = 0  # offset of the first buffered byte
+        self._start = None
+        self._need = _MIN_HEADER_SIZE  # no progress can be made before that offset
+
+    @property
+    def version(self):
+        return int.from_bytes(self.header[0x08:0x0C], 'little')
+
+    def feed(self, data):
+        if self.done:
+            return
+        self._buf += data
+        self._skip_to_start()
+
+    def events(self):
+        if self.done or self._offset + len(self._buf) < self._need:
+            return
+        if self.header is None:
+            self._parse_header()
+            if self._offset + len(self._buf) < self._start:
+                return
+        unp = _BufferUnpacker(self._buf)
+        try:
+            for event in _events(unp, self.version, self.comset):
+                unp.mark = unp.offset
+                yield event
+            self.done = True
+        except unpacker.NoDataError:
+            pass
+        finally:
+            # everything before the command being decoded is done with,
+            # whether it was yielded or filtered out
+            end = unp.offset if self.done else unp.mark
+            unp.release()
+            if not self.done:
+                self._need = self._offset + end + self._pending_length(end)
+            del self._buf[:end]
+            self._offset += end
+            if self.done:
+                self._buf.clear()
+
+    def close(self):
+        """Checks that the whole song has been fed."""
+        if not self.done:
+            raise TruncatedVgmFile(None)
+
+    def _parse_header(self):
+        if self._buf[:4] != b'Vgm ':
+            raise BadVgmFile(None, bytes(self._buf[:4]))
+        unp = unpacker.Unpacker(bytes(self._buf[:_MIN_HEADER_SIZE]))
+        _seek_vgm_data_start(unp)
+        self._start = unp.offset
+        self.header = bytes(self._buf[:min(self._start, _HEADER_SIZE)])
+        self._skip_to_start()
+
+    def _skip_to_start(self):
+        if self._start is not None and self._offset < self._start:
+            count = min(self._start - self._offset, len(self._buf))
+            del self._buf[:count]
+            self._offset += count
+
+    def _pending_length(self, pos):
+        """Bytes that must be buffered from `pos` before decoding can resume."""
+        header = self._buf[pos : pos + _DATA_BLOCK_HEADER_LENGTH]
+        if len(header) == _DATA_BLOCK_HEADER_LENGTH and header[0] == 0x67:
+            size = int.from_bytes(header[3:], 'little')
+            return _DATA_BLOCK_HEADER_LENGTH + size
+        return len(self._buf) - pos + 1
+
+class _BufferUnpacker(unpacker.Unpacker):
+    """Unpacker over a view of the buffer of a `Parser`; `mark` is the offset
+    of the command being decoded, where decoding resumes on more data."""
+    def __init__(self, buf):
+        self._view = memoryview(buf)
+        super().__init__(self._view)
+        self.mark = 0
+    def byte(self):
+        self.mark = self.offset
+        return super().byte()
+    def skip(self, length):
+        if self.offset + length > len(self.data):
+            raise unpacker.NoDataError(self.offset, length, self.left())
+        super().skip(length)
+    def bytes(self, length):
+        return bytes(super().bytes(length))
+    def release(self):
+        self.data.release()
+        self._view.release()
+
+class PipeSong(Song):
+    """VGM song read from a non-seekable stream such as stdin, possibly
+    gzip-compressed; its events can only be iterated once."""
+    chunk_size = 0x10000
+    def __init__(self, file, name=None):
+        self.name = name
+        self._file = file
+        self._eof = False
+        first = file.read(self.chunk_size)
+        if first[:2] == _GZIP_MAGIC:
+            self._decompressor = zlib.decompressobj(wbits=16 + zlib.MAX_WBITS)
+        else:
+            self._decompressor = None
+        head = bytearray(self._decompress(first))
+        while len(head) < _HEADER_SIZE and (chunk := self._read()) is not None:
+            head += chunk
+        if head[:4] != b'Vgm ' or len(head) < _MIN_HEADER_SIZE:
+            raise BadVgmFile(name, bytes(head[:4]))
+        self.header = bytes(head[:_HEADER_SIZE])
+        self._head = bytes(head)
+
+    def _decompress(self, data):
+        if self._decompressor is None:
+            return data
+        return self._decompressor.decompress(data)
+
+    def _read(self):
+        """Returns the next chunk of decompressed data, or None at the end."""
+        while not self._eof:
+            data = self._file.read(self.chunk_size)
+            if not data:
+                self._eof = True
+                if self._decompressor is not None:
+                    return self._decompressor.flush()
+            elif data := self._decompress(data):
+                return data
+        return None
+
+    def _chunks(self):
+        if self._head is None:
+            raise ValueError('stream has already been read')
+        head = self._head
+        self._head = None
+        yield head
+        while (chunk := self._read()) is not None:
+            yield chunk
+
+    def _unpacker(self):
+        return unpacker.StreamUnpacker(_ChunkReader(self._chunks()))
+
+    def events(self, *chiplist, start=None):
+        if start is not None:
+            return super().events(*chiplist, start=start)
+        return self._parse(*chiplist)
+
+    def _parse(self, *chiplist):
+        parser = Parser(*chiplist)
+        for chunk in self._chunks():
+            parser.feed(chunk)
+            yield from parser.events()
+            if parser.done:
+                return
+        raise TruncatedVgmFile(self.name)
+
+    def read(self):
+        return b''.join(self._chunks())
+
+    def loop(self):
+        # the stream can't be read twice to look for repeated loop bodies
+        return super().loop(repeats=False)
+
+class _ChunkReader:
+    """Read-only file-like object over an iterator of byte chunks."""
+    def __init__(self, chunks):
+        self._chunks = chunks
+        self._buf = bytearray()
+    def read(self, size):
+        while len(self._buf) < size and (chunk := next(self._chunks, None)) is not None:
+            self._buf += chunk
+        data = bytes(self._buf[:size])
+        del self._buf[:size]
+        return data
+    def close(self):
+        pass
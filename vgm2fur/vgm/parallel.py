@@ -0,0 +1,74 @@
+import concurrent.futures
+import os
+from . import unpacker
+from .song import (UnknownCommand, _events, _chip_comset, _seek_vgm_data_start,
+    _reporting_truncation, _com_lengths, _DATA_BLOCK_HEADER_LENGTH, _PCM_WRITE_LENGTH)
+
+# slices smaller than that are not worth sending to another process
+MIN_SLICE_SIZE = 0x40000
+# slices per worker, to even out the load
+SLICES_PER_JOB = 4
+
+def parallel_events(song, *chiplist, jobs=None):
+    """Same as `song.events(*chiplist)`, but decodes slices of the song in
+    `jobs` worker processes."""
+    if jobs is None:
+        jobs = os.cpu_count() or 1
+    if jobs == 1:
+        yield from song.events(*chiplist)
+        return
+    data = song.read()
+    unp = unpacker.Unpacker(data)
+    _seek_vgm_data_start(unp)
+    slice_size = max(MIN_SLICE_SIZE, (len(data) - unp.offset) // (jobs * SLICES_PER_JOB) + 1)
+    with _reporting_truncation(song.name):
+        slices = list(_split(data, unp.offset, song.version, slice_size))
+    if len(slices) <= 1:
+        yield from song.events(*chiplist)
+        return
+
+    version = song.version
+    comset = _chip_comset(chiplist)
+    with concurrent.futures.ProcessPoolExecutor(max_workers=jobs) as pool:
+        results = pool.map(_decode_slice,
+            (bytes(data[a:b]) for (a, b) in slices),
+            (version for _ in slices),
+            (comset for _ in slices))
+        for events in results:
+            yield from events
+
+def _split(data, offset, version, slice_size):
+    """Yields `(start, end)` offsets of consecutive slices of `data`, each
+    containing whole commands only, from `offset` to the end of the song."""
+    lengths = _com_lengths(version)
+    start = offset
+    try:
+        while True:
+            com = data[offset]
+            length = lengths[com]
+            if length > 0:
+                offset += length
+            elif com == 0x66:
+                break
+            elif com == 0x67:
+                size = data[offset + 3 : offset + _DATA_BLOCK_HEADER_LENGTH]
+                offset += _DATA_BLOCK_HEADER_LENGTH + int.from_bytes(size, 'little')
+            elif com == 0x68:
+                offset += _PCM_WRITE_LENGTH
+            else:
+                raise UnknownCommand(com)
+            if offset - start >= slice_size:
+                yield (start, offset)
+                start = offset
+    except IndexError:
+        raise unpacker.NoDataError(offset, 1, 0) from None
+    if offset > start:
+        yield (start, offset)
+
+def _decode_slice(data, version, comset):
+    # the slice ends on a command boundary, so the appended end-of-data
+    # command stops the decoder exactly at its end
+    unp = unpacker.Unpacker(data + b'\x66')
+    # payloads are views of the slice, which cannot be sent back as is
+    return [(com[0], com[1], bytes(com[2])) if com[0] == 0x67 else com
+        for com in _events(unp, version, comset)]
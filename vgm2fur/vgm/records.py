@@ -0,0 +1,150 @@
+"""VGM commands which can change the state of YM2612 and SN76489, as
+`(kind, a, b)` records."""
+from typing import NamedTuple
+from .song import (EventCursor, UnknownCommand, _com_table, _reporting_truncation,
+    _DATA_BLOCK, _PCM_WRITE_LENGTH, _NOPARAMS, _UNPACK, _SKIP)
+
+# record kinds and their arguments
+YM2612 = 0       # port << 8 | register, data
+SN76489 = 1      # 0, data
+WAIT = 2         # offset of the next command (0 if unknown), duration
+DAC = 3          # offset of the next command (0 if unknown), duration of the wait
+SET_POINTER = 4  # 0, pointer
+DATA_BLOCK = 5   # offset of the command (0 if unknown), `DataBlock`
+
+class DataBlock(NamedTuple):
+    type: int
+    data: bytes
+
+def decode_records(events):
+    """Turns VGM events into records. Commands of an `EventCursor` are read
+    from its unpacker without being decoded into events, and their records
+    hold offsets."""
+    if isinstance(events, EventCursor):
+        return _decode(events)
+    return _convert(events)
+
+def _convert(events):
+    for event in events:
+        match event:
+            case (0x52 | 0x53 as x, addr, data):
+                yield (YM2612, (x - 0x52) << 8 | addr, data)
+            case (0x50, data):
+                yield (SN76489, 0, data)
+            case (0x61, delta):
+                yield (WAIT, 0, delta)
+            case (0x62,):
+                yield (WAIT, 0, 735)
+            case (0x63,):
+                yield (WAIT, 0, 882)
+            case (x,) if 0x70 <= x and x <= 0x7F:
+                yield (WAIT, 0, x - 0x70 + 1)
+            case (x,) if 0x80 <= x and x <= 0x8F:
+                yield (DAC, 0, x - 0x80)
+            case (0xE0, ptr):
+                yield (SET_POINTER, 0, ptr)
+            case (0x67, type, data):
+                yield (DATA_BLOCK, 0, DataBlock(type, data))
+
+# operations of command bytes for `_decode`
+_OP_SKIP = 0       # arg: parameter length; the command is filtered out
+_OP_SKIP_DATA = 1  # data block which is filtered out
+_OP_FM = 2         # arg: port << 8
+_OP_WAIT = 3       # arg: duration
+_OP_WAIT16 = 4
+_OP_DAC = 5        # arg: duration
+_OP_PSG = 6
+_OP_POINTER = 7    # arg: parameter struct
+_OP_IGNORE = 8     # arg: parameter length
+_OP_DATA = 9
+_OP_PCM_WRITE = 10
+_OP_END = 11
+_OP_UNKNOWN = 12   # arg: command
+
+_op_tables = {}
+
+def _op_table(version, comset):
+    """Maps every command byte to `(op, arg)`, decoding commands as
+    `song._events` does with the same arguments."""
+    key = (version >= 0x160, None if comset is None else frozenset(comset))
+    if key in _op_tables:
+        return _op_tables[key]
+    table = []
+    for com, (kind, arg) in enumerate(_com_table(version, comset)):
+        if kind == _SKIP:
+            table.append((_OP_SKIP, arg))
+        elif com in {0x52, 0x53}:
+            table.append((_OP_FM, (com - 0x52) << 8))
+        elif com == 0x50:
+            table.append((_OP_PSG, None))
+        elif com == 0x61:
+            table.append((_OP_WAIT16, None))
+        elif com == 0x62:
+            table.append((_OP_WAIT, 735))
+        elif com == 0x63:
+            table.append((_OP_WAIT, 882))
+        elif 0x70 <= com <= 0x7F:
+            table.append((_OP_WAIT, com - 0x70 + 1))
+        elif 0x80 <= com <= 0x8F:
+            table.append((_OP_DAC, com - 0x80))
+        elif com == 0xE0:
+            table.append((_OP_POINTER, arg))
+        elif kind == _UNPACK:
+            table.append((_OP_IGNORE, arg.size))
+        elif kind == _NOPARAMS:
+            table.append((_OP_IGNORE, 0))
+        elif com == 0x66:
+            table.append((_OP_END, None))
+        elif com == 0x67:
+            kept = comset is None or 0x67 in comset
+            table.append((_OP_DATA if kept else _OP_SKIP_DATA, None))
+        elif com == 0x68:
+            kept = comset is None or 0x68 in comset
+            table.append((_OP_PCM_WRITE, None) if kept else (_OP_SKIP, _PCM_WRITE_LENGTH - 1))
+        else:
+            table.append((_OP_UNKNOWN, com))
+    table = tuple(table)
+    _op_tables[key] = table
+    return table
+
+def _decode(cursor):
+    ops = _op_table(cursor.version, cursor.comset)
+    unp = cursor.unpacker
+    byte = unp.byte
+    skip = unp.skip
+    with unp, _reporting_truncation(cursor.name):
+        while True:
+            op, arg = ops[byte()]
+            if op == _OP_SKIP:
+                skip(arg)
+            elif op == _OP_FM:
+                reg = arg | byte()
+                yield (YM2612, reg, byte())
+            elif op == _OP_WAIT:
+                yield (WAIT, unp.offset, arg)
+            elif op == _OP_DAC:
+                yield (DAC, unp.offset, arg)
+            elif op == _OP_PSG:
+                yield (SN76489, 0, byte())
+            elif op == _OP_WAIT16:
+                arg = byte() | byte() << 8
+                yield (WAIT, unp.offset, arg)
+            elif op == _OP_POINTER:
+                yield (SET_POINTER, 0, unp.unpack_struct(arg)[0])
+            elif op == _OP_IGNORE:
+                skip(arg)
+            elif op == _OP_DATA or op == _OP_SKIP_DATA:
+                start = unp.offset - 1
+                unp.expect('B', 0x66)
+                type, length = unp.unpack_struct(_DATA_BLOCK)
+                if op == _OP_SKIP_DATA:
+                    skip(length)
+                else:
+                    yield (DATA_BLOCK, start, DataBlock(type, unp.bytes(length)))
+            elif op == _OP_PCM_WRITE:
+                unp.expect('B', 0x66)
+                skip(_PCM_WRITE_LENGTH - 2)
+            elif op == _OP_END:
+                return
+            else:
+                raise UnknownCommand(arg)
@@ -1,7 +1,10 @@
+import contextlib
 import gzip
+import mmap
+from typing import NamedTuple
 from . import unpacker
 from vgm2fur import AppError as Vgm2FurError
-from vgm2fur import bitfield
+from vgm2fur import registers as regs
 
 class BadVgmFile(Vgm2FurError):
     def __init__(self, filename, preamble):
@@ -11,6 +14,13 @@ class BadVgmFile(Vgm2FurError):
     def __str__(self):
         return f'file "{self.filename}" is not a VGM file'
 
+class TruncatedVgmFile(Vgm2FurError):
+    def __init__(self, filename):
+        super().__init__(filename)
+        self.filename = filename
+    def __str__(self):
+        return f'file "{self.filename}" ends unexpectedly'
+
 class UnknownCommand(Vgm2FurError):
     def __init__(self, com):
         super().__init__(com)
@@ -18,59 +28,209 @@ class UnknownCommand(Vgm2FurError):
     def __str__(self):
         return f'unknown VGM command: {self.com:#04x}'
 
+_HEADER_SIZE = 0x100
+_GZIP_MAGIC = b'\x1f\x8b'
+# bytes of loop bodies compared at once
+_COMPARE_CHUNK = 0x10000
+
 class Song:
-    def __init__(self, data):
+    def __init__(self, data, name=None):
         if data[:4] != b'Vgm ':
-            raise BadVgmFile(None)
+            raise BadVgmFile(None, bytes(data[:4]))
+        self.name = name
         self.data = data
+        self.header = data[:_HEADER_SIZE]
 
-    def events(self, *chiplist):
-        unp = unpacker.Unpacker(self.data)
-        _seek_vgm_data_start(unp)
-        if len(chiplist) > 0:
-            comset = {0x61, 0x62, 0x63, *range(0x70, 0x90)}
-            for chip in chiplist:
-                match chip:
-                    case 'ym2612':
-                        comset |= {0x52, 0x53}
-                    case 'sn76489':
-                        comset |= {0x50}
-                    case 'data':
-                        comset |= {0x67}
-                    case 'dac':
-                        comset |= {*range(0x90, 0x96), 0xE0}
-            for com in _events(unp, self.version):
-                if com[0] in comset:
-                    yield com
-        else:
-            yield from _events(unp, self.version)
+    def _unpacker(self):
+        return unpacker.Unpacker(self.data)
+
+    def read(self):
+        return self.data
+
+    def events(self, *chiplist, start=None):
+        return self.cursor(*chiplist, start=start)
+
+    def cursor(self, *chiplist, start=None):
+        """Like `events`, but returns an `EventCursor`, which also tells the
+        offset of the next command. `start` is the offset to decode from
+        (beginning of VGM data by default)."""
+        return EventCursor(self._unpacker(), self.version, _chip_comset(chiplist), start,
+            self.name)
 
     @property
     def version(self):
-        return int.from_bytes(self.data[0x08:0x0C], 'little')
+        return int.from_bytes(self.header[0x08:0x0C], 'little')
 
     @property
     def total_wait(self):
-        return int.from_bytes(self.data[0x18:0x1C], 'little')
+        return int.from_bytes(self.header[0x18:0x1C], 'little')
 
     @property
     def playback_rate(self):
-        return int.from_bytes(self.data[0x24:0x28], 'little')
+        return int.from_bytes(self.header[0x24:0x28], 'little')
 
-def load(filename):
+    @property
+    def loop_offset(self):
+        rel = int.from_bytes(self.header[0x1C:0x20], 'little')
+        return 0x1C + rel if rel != 0 else None
+
+    @property
+    def loop_samples(self):
+        return int.from_bytes(self.header[0x20:0x24], 'little')
+
+    def loop(self, *, repeats=True):
+        """Returns the first pass of the looped part as `Loop`, or None. With
+        `repeats`, the loop is moved back over copies of its body before it."""
+        offset = self.loop_offset
+        samples = self.loop_samples
+        if offset is None or samples == 0:
+            return None
+        end = self.total_wait
+        start = end - samples
+        if not repeats:
+            return Loop(start, end)
+        with self._unpacker() as unp, _reporting_truncation(self.name):
+            _seek_vgm_data_start(unp)
+            data_start = unp.offset
+            unp.offset = offset
+            # skips everything up to the end of data command
+            for _ in _events(unp, self.version, frozenset()):
+                pass
+            length = unp.offset - 1 - offset
+        if length <= 0:
+            return Loop(start, end)
+        copies = min(start // samples, (offset - data_start) // length)
+        if copies > 0:
+            copies = self._repeats(offset, length, copies)
+        return Loop(start - copies * samples, end - copies * samples)
+
+    def _repeats(self, offset, length, copies):
+        """Counts how many of `copies` bodies of `length` bytes right before
+        `offset` repeat the body at `offset`."""
+        first = offset - copies * length
+        with self._unpacker() as a, self._unpacker() as b, _reporting_truncation(self.name):
+            a.offset = first
+            b.offset = first + length
+            # only the bodies after the last mismatch repeat the loop
+            pos = first
+            matched = copies
+            for i in range(copies):
+                end = pos + length
+                while pos < end:
+                    size = min(end - pos, _COMPARE_CHUNK)
+                    if a.bytes(size) != b.bytes(size):
+                        matched = copies - 1 - i
+                        a.skip(end - pos - size)
+                        b.skip(end - pos - size)
+                        break
+                    pos += size
+                pos = end
+        return matched
+
+class Loop(NamedTuple):
+    start: int
+    end: int
+
+class StreamSong(Song):
+    """VGM song decoded through a bounded buffer; the file is reopened with
+    `opener` for every call to `events`."""
+    def __init__(self, opener, name=None):
+        with opener() as f:
+            header = f.read(_HEADER_SIZE)
+        if header[:4] != b'Vgm ':
+            raise BadVgmFile(None, header[:4])
+        self.name = name
+        self.header = header
+        self._opener = opener
+
+    def _unpacker(self):
+        return unpacker.StreamUnpacker(self._opener())
+
+    def read(self):
+        with self._opener() as f, _reporting_truncation(self.name):
+            return f.read()
+
+class EventCursor:
+    """Iterable over song events. While iterating, `offset` is the offset
+    of the command following the last yielded event."""
+    def __init__(self, unp, version, comset, start, name=None):
+        with _reporting_truncation(name):
+            if start is None:
+                _seek_vgm_data_start(unp)
+            else:
+                unp.offset = start
+        self._unp = unp
+        self.version = version
+        self.comset = comset
+        self.name = name
+        self._events = _closing_events(unp, version, comset, name)
+
+    def __iter__(self):
+        return self._events
+
+    @property
+    def offset(self):
+        return self._unp.offset
+
+    @property
+    def unpacker(self):
+        """Unpacker positioned at the next command, for decoders that read
+        commands by themselves instead of iterating; it must be closed by
+        them."""
+        return self._unp
+
+def _closing_events(unp, version, comset, name):
+    with unp, _reporting_truncation(name):
+        yield from _events(unp, version, comset)
+
+@contextlib.contextmanager
+def _reporting_truncation(name):
+    """Reports data of the song `name` ending in the middle of a command
+    as `TruncatedVgmFile`."""
     try:
-        with gzip.open(filename) as f:
-            data = f.read()
-    except gzip.BadGzipFile:
-        with open(filename, 'rb') as f:
-            data = f.read()
+        yield
+    except (unpacker.NoDataError, EOFError):
+        raise TruncatedVgmFile(name) from None
+
+def load(filename):
+    with open(filename, 'rb') as f:
+        compressed = f.read(len(_GZIP_MAGIC)) == _GZIP_MAGIC
+        if not compressed:
+            data = _map_file(f)
 
     try:
-        return Song(data)
+        if compressed:
+            return StreamSong(lambda: gzip.open(filename), filename)
+        else:
+            return Song(data, filename)
     except BadVgmFile as err:
         err.filename = filename
         raise err
 
+def _map_file(f):
+    try:
+        return memoryview(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+    except (ValueError, OSError):
+        # empty files and special files cannot be mapped
+        f.seek(0)
+        return f.read()
+
+def _chip_comset(chiplist):
+    if len(chiplist) == 0:
+        return None
+    comset = {0x61, 0x62, 0x63, *range(0x70, 0x90)}
+    for chip in chiplist:
+        match chip:
+            case 'ym2612':
+                comset |= {0x52, 0x53}
+            case 'sn76489':
+                comset |= {0x50}
+            case 'data':
+                comset |= {0x67}
+            case 'dac':
+                comset |= {*range(0x90, 0x96), 0xE0}
+    return comset
+
 def _seek_vgm_data_start(unp):
     unp.offset = 0x34
     rel = unp.unpack('L')
@@ -79,19 +239,6 @@ def _seek_vgm_data_start(unp):
     else:
         unp.offset = 0x34 + rel
 
-class Unpack:
-    __match_args__ = ('format',)
-    def __init__(self, format):
-        self.format = format
-
-class NoParams:
-    pass
-
-class SpecialCase:
-    __match_args__ = ('com',)
-    def __init__(self, com):
-        self.com = com
-
 class irange:
     def __init__(self, a, b):
         self.a = a
@@ -104,8 +251,17 @@ class irange:
     def __contains__(self, x):
         return self.a <= x and x <= self.b
 
-def _make_com_kinds():
-    kinds = {}
+# kinds of entries of the command table
+_UNKNOWN = 0
+_NOPARAMS = 1
+_UNPACK = 2
+_SPECIAL = 3
+_SKIP = 4
+
+def _make_com_table(dual_chip_params):
+    """Builds `(kind, arg)` for every command byte; `arg` is the event, the
+    parameter `struct.Struct` or the command, depending on `kind`."""
+    table = [(_UNKNOWN, None)] * 256
     noparams = [0x62, 0x63, *irange(0x70, 0x8F)]
     unpack = [
         ([*irange(0x30, 0x3F), 0x4F, 0x50, 0x94], 'B'),
@@ -121,84 +277,133 @@ def _make_com_kinds():
         ([0x92], 'BL'),
         ([0x93], 'BLBL'),
         ([0x95], 'BHB'),
+        ([*irange(0x41, 0x4E)], 'BB' if dual_chip_params else 'B'),
     ]
-    special = [*irange(0x41, 0x4E), 0x66, 0x67, 0x68]
+    special = [0x66, 0x67, 0x68]
     for command in noparams:
-        kinds[command] = NoParams()
+        table[command] = (_NOPARAMS, (command,))
     for commands, format in unpack:
+        st = unpacker.compile(format)
         for command in commands:
-            kinds[command] = Unpack(format)
+            table[command] = (_UNPACK, st)
     for command in special:
-        kinds[command] = SpecialCase(command)
-    return kinds
-
-def _unpack_24bit(unp):
-    return int.from_bytes(unp.bytes(3), 'little')
-
-_COM_KINDS = _make_com_kinds()
-def _events(unp, version):
-    done = False
-    while not done:
-        com = unp.byte()
-        match _COM_KINDS.get(com):
-            case NoParams():
-                yield (com,)
-            case Unpack(format):
-                yield (com,) + unp.unpack_tuple(format)
-            case SpecialCase(x) if x in irange(0x41, 0x4E):
-                if version >= 0x160:
-                    yield (com,) + unp.unpack('BB')
-                else:
-                    yield (com, unp.byte())
-            case SpecialCase(0x66):
-                done = True
-            case SpecialCase(0x67):
-                unp.expect('B', 0x66)
-                type, length = unp.unpack('BL')
+        table[command] = (_SPECIAL, command)
+    return tuple(table)
+
+# commands 0x41..0x4E take two parameter bytes since VGM 1.60
+_COM_TABLES = (_make_com_table(False), _make_com_table(True))
+_DATA_BLOCK = unpacker.compile('BL')
+_PCM_WRITE = unpacker.compile('B3s3s3s')
+
+def _make_length_table(table):
+    """Lengths of commands in bytes, including the command byte itself.
+    Zero for commands that have to be handled as special cases."""
+    lengths = []
+    for kind, arg in table:
+        if kind == _NOPARAMS:
+            lengths.append(1)
+        elif kind == _UNPACK:
+            lengths.append(1 + arg.size)
+        else:
+            lengths.append(0)
+    return tuple(lengths)
+
+_COM_LENGTHS = tuple(map(_make_length_table, _COM_TABLES))
+# 0x67 0x66 tt ss ss ss ss: data block header, followed by the payload
+_DATA_BLOCK_HEADER_LENGTH = 7
+# 0x68 0x66 cc oo oo oo dd dd dd ss ss ss: PCM RAM write
+_PCM_WRITE_LENGTH = 12
+
+# filtered tables by VGM version and command set; parsers fed in small
+# chunks ask for them over and over
+_filtered_com_tables = {}
+
+def _com_table(version, comset=None):
+    """Returns the command table for given VGM version. If `comset` is given,
+    all other commands are turned into entries that skip their parameters."""
+    table = _COM_TABLES[version >= 0x160]
+    if comset is None:
+        return table
+    key = (version >= 0x160, frozenset(comset))
+    if key in _filtered_com_tables:
+        return _filtered_com_tables[key]
+    lengths = _com_lengths(version)
+    filtered = list(table)
+    for com, (kind, _) in enumerate(table):
+        if com not in comset and kind in {_NOPARAMS, _UNPACK}:
+            filtered[com] = (_SKIP, lengths[com] - 1)
+    filtered = tuple(filtered)
+    _filtered_com_tables[key] = filtered
+    return filtered
+
+def _com_lengths(version):
+    return _COM_LENGTHS[version >= 0x160]
+
+def _events(unp, version, comset=None):
+    table = _com_table(version, comset)
+    keep_data = comset is None or 0x67 in comset
+    keep_pcm_write = comset is None or 0x68 in comset
+    byte = unp.byte
+    skip = unp.skip
+    unpack_struct = unp.unpack_struct
+    while True:
+        com = byte()
+        kind, arg = table[com]
+        if kind == _UNPACK:
+            yield (com,) + unpack_struct(arg)
+        elif kind == _SKIP:
+            skip(arg)
+        elif kind == _NOPARAMS:
+            yield arg
+        elif com == 0x66:
+            return
+        elif com == 0x67:
+            unp.expect('B', 0x66)
+            type, length = unpack_struct(_DATA_BLOCK)
+            if keep_data:
                 payload = unp.bytes(length)
                 yield (com, type, payload)
-            case SpecialCase(0x68):
-                unp.expect('B', 0x66)
-                type = unp.unpack('B')
-                readoff = _unpack_24bit(unp)
-                writeoff = _unpack_24bit(unp)
-                size = _unpack_24bit(unp)
-                if size == 0:
-                    size = 0x1000000
-                yield (com, type, readoff, writeoff, size)
-            case _:
-                raise UnknownCommand(com)
-
-def _event_bytes(event):
-    ev0 = event[0].to_bytes(1, 'little')
-    match _COM_KINDS.get(event[0]):
-        case NoParams():
-            return ev0
-        case Unpack(format):
-            return ev0 + unpacker.pack(format, *event[1:])
-        case SpecialCase(x) if x in irange(0x41, 0x4E):
-            if len(event) == 3:
-                return ev0 + unpacker.pack('BB', *event[1:])
             else:
-                return ev0 + unpacker.pack('B', *event[1:])
-        case SpecialCase(0x67):
-            return ev0 + b'\x66' + unpacker.pack('BL', event[1], event[2])
-        case SpecialCase(0x68):
-            return b''.join([
-                ev0, 
-                b'\x66',
-                unpacker.pack('B', event[1]),
-                event[2].to_bytes(3, 'little'),
-                event[3].to_bytes(3, 'little'),
-                (event[4] & 0xFFFFFF).to_bytes(3, 'little'),
-            ])
-        case _:
+                skip(length)
+        elif com == 0x68 and not keep_pcm_write:
+            skip(_PCM_WRITE_LENGTH - 1)
+        elif com == 0x68:
+            unp.expect('B', 0x66)
+            type, readoff, writeoff, size = unpack_struct(_PCM_WRITE)
+            size = int.from_bytes(size, 'little')
+            if size == 0:
+                size = 0x1000000
+            yield (com, type, int.from_bytes(readoff, 'little'),
+                int.from_bytes(writeoff, 'little'), size)
+        else:
             raise UnknownCommand(com)
 
-def events_csv(events):
-    t = 0
+def _event_bytes(event):
+    com = event[0]
+    ev0 = com.to_bytes(1, 'little')
+    dual_chip_params = com in irange(0x41, 0x4E) and len(event) == 3
+    kind, arg = _COM_TABLES[dual_chip_params][com]
+    if kind == _NOPARAMS:
+        return ev0
+    elif kind == _UNPACK:
+        return ev0 + arg.pack(*event[1:])
+    elif com == 0x67:
+        return ev0 + b'\x66' + _DATA_BLOCK.pack(event[1], len(event[2]))
+    elif com == 0x68:
+        return ev0 + b'\x66' + _PCM_WRITE.pack(event[1],
+            event[2].to_bytes(3, 'little'),
+            event[3].to_bytes(3, 'little'),
+            (event[4] & 0xFFFFFF).to_bytes(3, 'little'))
+    else:
+        raise UnknownCommand(com)
+
+def events_csv(events, *, t=0, begin=0, end=None):
+    """Describes events as CSV lines. `t` is the time of the first event;
+    only events from `begin` (inclusive) to `end` (exclusive) are listed."""
     yield 'Sample,Description,Raw data'
     for event in events:
+        if end is not None and t >= end:
+            break
         rawdata = ' '.join(f'{x:02X}' for x in _event_bytes(event))
         wait = 0
         match event:
@@ -207,68 +412,76 @@ def events_csv(events):
                 rawdata += ' ...'
             case (0x52, addr, data) | (0x53, addr, data):
                 port = event[0] & 1
-                d = bitfield.make(data)
                 match (port, addr):
                     case (0, 0x22):
-                        res = 'En' if d[3] else 'Dis'
-                        descr = f'YM2612 LFO {res} Val={d[2:0]}'
+                        d = regs.LFO[data]
+                        res = 'En' if d.enable else 'Dis'
+                        descr = f'YM2612 LFO {res} Val={d.freq}'
                     case (0, 0x27):
                         fm3mode = ['normal', 'special', 'CSM', '??']
-                        descr = f'YM2612 FM3 mode: {fm3mode[d[7:6]]}'
+                        descr = f'YM2612 FM3 mode: {fm3mode[regs.CH3_MODE[data].mode]}'
                     case (0, 0x28):
-                        i = d[2:0] % 4 + 3 * (d[2:0] // 4)
-                        opmask = d[7:4]
-                        if opmask == 0:
+                        d = regs.KEY_ON[data]
+                        i = d.channel % 4 + 3 * (d.channel // 4)
+                        if d.opmask == 0:
                             descr = f'YM2612 FM{i+1} key off'
                         else:
-                            descr = f'YM2612 FM{i+1} key on ({opmask:X})'
+                            descr = f'YM2612 FM{i+1} key on ({d.opmask:X})'
                     case (0, 0x2B):
-                        res = 'En' if d[7] else 'Dis'
+                        res = 'En' if regs.DAC_ENABLE[data].enable else 'Dis'
                         descr = f'YM2612 DAC {res}'
                     case (p, a) if (a & 0xF0) == 0x30:
-                        dt = d[5:4] if d[6] == 0 else -d[5:4]
-                        descr = _fm_op(p, a) + f'Mult={d[3:0]} Dt={dt}'
+                        d = regs.DT_MULT[data]
+                        dt = d.dt if d.dt_sign == 0 else -d.dt
+                        descr = _fm_op(p, a) + f'Mult={d.mult} Dt={dt}'
                     case (p, a) if (a & 0xF0) == 0x40:
-                        descr = _fm_op(p, a) + f'TL={d[6:0]}'
+                        descr = _fm_op(p, a) + f'TL={regs.TL[data].tl}'
                     case (p, a) if (a & 0xF0) == 0x50:
-                        descr = _fm_op(p, a) + f'AR={d[4:0]} RS={d[6:0]}'
+                        # RS is printed as bits 6..0
+                        descr = _fm_op(p, a) + f'AR={regs.RS_AR[data].ar} RS={data & 0x7F}'
                     case (p, a) if (a & 0xF0) == 0x60:
-                        op = _fm_op(p, a)
-                        descr = _fm_op(p, a) + f'DR={d[4:0]} AM={d[7]}'
+                        d = regs.AM_DR[data]
+                        descr = _fm_op(p, a) + f'DR={d.dr} AM={d.am}'
                     case (p, a) if (a & 0xF0) == 0x70:
-                        descr = _fm_op(p, a) + f'SR={d[4:0]}'
+                        descr = _fm_op(p, a) + f'SR={regs.SR[data].sr}'
                     case (p, a) if (a & 0xF0) == 0x80:
-                        descr = _fm_op(p, a) + f'RR={d[3:0]} SL={d[7:4]}'
+                        d = regs.SL_RR[data]
+                        descr = _fm_op(p, a) + f'RR={d.rr} SL={d.sl}'
                     case (p, a) if (a & 0xF0) == 0x90:
-                        res = 'En' if d[3] else 'Dis'
-                        descr = _fm_op(p, a) + f'SSG {res} = {d[2:0]}'
+                        d = regs.SSG[data]
+                        res = 'En' if d.enable else 'Dis'
+                        descr = _fm_op(p, a) + f'SSG {res} = {d.ssg}'
                     case (p, a) if (a & 0xFC) == 0xA0:
-                        descr = _fm_ch(p, a) + f'FreqL={d[7:0]}'
+                        descr = _fm_ch(p, a) + f'FreqL={data}'
                     case (p, a) if (a & 0xFC) == 0xA4:
-                        descr = _fm_ch(p, a) + f'FreqH={d[2:0]} Block={d[5:3]}'
+                        d = regs.BLOCK_FREQ[data]
+                        descr = _fm_ch(p, a) + f'FreqH={d.freq} Block={d.block}'
                     case (0, a) if (a & 0xFC) == 0xA8:
-                        descr = _fm_ch3_op(a) + f'FreqL={d[7:0]}'
+                        descr = _fm_ch3_op(a) + f'FreqL={data}'
                     case (0, a) if (a & 0xFC) == 0xAC:
-                        descr = _fm_ch3_op(a) + f'FreqH={d[2:0]} Block={d[5:3]}'
+                        d = regs.BLOCK_FREQ[data]
+                        descr = _fm_ch3_op(a) + f'FreqH={d.freq} Block={d.block}'
                     case (p, a) if (a & 0xFC) == 0xB0:
-                        descr = _fm_ch(p, a) + f'Alg={d[2:0]} FB={d[5:3]}'
+                        d = regs.FB_ALG[data]
+                        descr = _fm_ch(p, a) + f'Alg={d.alg} FB={d.fb}'
                     case (p, a) if (a & 0xFC) == 0xB4:
-                        descr = _fm_ch(p, a) + f'AMS={d[2:0]} PMS={d[5:4]} Pan={d[7:6]}'
+                        d = regs.PAN[data]
+                        descr = _fm_ch(p, a) + f'AMS={d.pms} PMS={d.ams} Pan={d.pan}'
                     case _:
                         descr = 'YM2612 unrecognized command'
             case (0x50, data):
-                d = bitfield.make(data)
-                if d[7]:
-                    if d[4]:
-                        ch = f'PSG{1+d[6:5]} ' if d[6:5] != 3 else 'PSG Noise '
-                        descr = 'SN76489 ' + ch + f'Vol={d[3:0]}'
-                    elif d[6:5] != 3:
-                        chno = 1+d[6:5]
-                        descr = f'SN76489 PSG{chno} FreqL={d[3:0]}'
+                d = regs.PSG_EVENT[data]
+                if d.is_action:
+                    if d.is_volume:
+                        ch = f'PSG{1+d.channel} ' if d.channel != 3 else 'PSG Noise '
+                        descr = 'SN76489 ' + ch + f'Vol={d.payload_l}'
+                    elif d.channel != 3:
+                        chno = 1+d.channel
+                        descr = f'SN76489 PSG{chno} FreqL={d.payload_l}'
                     else:
-                        descr = f'SN76489 PSG Noise Mode={d[3:0]}'
+                        descr = f'SN76489 PSG Noise Mode={d.payload_l}'
                 else:
-                    descr = f'SN76489 PSG^ FreqH={d[5:0]}'
+                    descr = f'SN76489 PSG^ FreqH={d.payload_h}'
             case (0x61, pause):
                 wait = pause
                 descr = f'Wait {wait} samples'
@@ -329,23 +542,22 @@ def events_csv(events):
                 descr = f'YM2612 DAC read={offset}'
             case _:
                 descr = ''
-        yield f'{t},{descr},{rawdata}'
+        if t >= begin:
+            yield f'{t},{descr},{rawdata}'
         t += wait
 
 def _fm_op(port, addr):
     _op_map = [1, 3, 2, 4]
-    addr = bitfield.make(addr)
-    ch = 1 + addr[1:0] + port * 3
-    op = _op_map[addr[3:2]]
+    addr = regs.ADDRESS[addr]
+    ch = 1 + addr.subch + port * 3
+    op = _op_map[addr.op]
     return f'YM2612 FM{ch} OP{op} '
 
 def _fm_ch(port, addr):
-    addr = bitfield.make(addr)
-    ch = 1 + addr[1:0] + port * 3
+    ch = 1 + regs.ADDRESS[addr].subch + port * 3
     return f'YM2612 FM{ch} '
 
 def _fm_ch3_op(addr):
     _ch3_op_map = [3, 1, 2]
-    addr = bitfield.make(addr)
-    op = _ch3_op_map[addr[1:0]]
+    op = _ch3_op_map[regs.ADDRESS[addr].subch]
     return f'YM2612 FM3 OP{op} '
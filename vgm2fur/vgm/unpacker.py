@@ -1,23 +1,23 @@
 import struct
 
 class Unpacker:
+    """Unpacker over a buffer held in memory; `bytes` returns slices of it."""
     def __init__(self, data):
-        self.data = data
+        self.data = memoryview(data)
         self.offset = 0
     def left(self):
-        left = len(data) - self.offset
+        left = len(self.data) - self.offset
         if left < 0:
             left = 0
         return left
     def unpack_tuple(self, format):
-        if format[0] not in '<>=@!':
-            format = '<' + format
-        size = struct.calcsize(format)
+        return self.unpack_struct(_struct(format))
+    def unpack_struct(self, st):
         try:
-            result = struct.unpack_from(format, self.data, self.offset)
+            result = st.unpack_from(self.data, self.offset)
         except struct.error as err:
-            raise NoDataError(size, self.left(), self.offset) from err
-        self.offset += size
+            raise NoDataError(self.offset, st.size, self.left()) from err
+        self.offset += st.size
         return result
     def unpack(self, format):
         result = self.unpack_tuple(format)
@@ -30,13 +30,13 @@ class Unpacker:
         try:
             result = self.data[self.offset]
         except IndexError as err:
-            raise NoDataError(1, self.left(), self.offset) from err
+            raise NoDataError(self.offset, 1, self.left()) from err
         self.offset += 1
         return result
     def bytes(self, length):
         result = self.data[self.offset : self.offset + length]
         if len(result) < length:
-            raise NoDataError(length, self.left(), self.offset)
+            raise NoDataError(self.offset, length, self.left())
         self.offset += length
         return result
     def skip(self, length):
@@ -45,6 +45,86 @@ class Unpacker:
         clone = Unpacker(self.data)
         clone.offset = self.offset
         return clone
+    def close(self):
+        pass
+    def __enter__(self):
+        return self
+    def __exit__(self, *exc_info):
+        self.close()
+
+class StreamUnpacker(Unpacker):
+    """Unpacker reading a binary file object through a bounded buffer; the
+    offset can only move forward."""
+    chunk_size = 0x10000
+    def __init__(self, file):
+        self.file = file
+        self.data = bytearray()
+        self._base = 0
+        self._pos = 0
+    @property
+    def offset(self):
+        return self._base + self._pos
+    @offset.setter
+    def offset(self, value):
+        if value < self._base:
+            raise ValueError(f'cannot seek back to offset {value:#010x} in a stream')
+        self._pos = value - self._base
+    def _fill(self, length):
+        available = len(self.data) - self._pos
+        if available >= length:
+            return
+        if available >= 0:
+            del self.data[:self._pos]
+            self._base += self._pos
+            self._pos = 0
+        else:
+            self._base += len(self.data)
+            self.data.clear()
+            self._pos = self._discard(-available)
+        while len(self.data) - self._pos < length:
+            chunk = self.file.read(max(self.chunk_size, length))
+            if not chunk:
+                break
+            self.data += chunk
+    def _discard(self, length):
+        while length > 0:
+            chunk = self.file.read(min(length, self.chunk_size))
+            if not chunk:
+                break
+            self._base += len(chunk)
+            length -= len(chunk)
+        return length
+    def left(self):
+        return max(len(self.data) - self._pos, 0)
+    def unpack_struct(self, st):
+        self._fill(st.size)
+        try:
+            result = st.unpack_from(self.data, self._pos)
+        except struct.error as err:
+            raise NoDataError(self.offset, st.size, self.left()) from err
+        self._pos += st.size
+        return result
+    def byte(self):
+        self._fill(1)
+        try:
+            result = self.data[self._pos]
+        except IndexError as err:
+            raise NoDataError(self.offset, 1, self.left()) from err
+        self._pos += 1
+        return result
+    def bytes(self, length):
+        self._fill(length)
+        result = bytes(self.data[self._pos : self._pos + length])
+        if len(result) < length:
+            raise NoDataError(self.offset, length, self.left())
+        self._pos += length
+        return result
+    def skip(self, length):
+        self._pos += length
+    def clone(self):
+        raise TypeError('stream unpackers cannot be cloned')
+    def close(self):
+        self.file.close()
 
 class NoDataError(Exception):
     def __init__(self, offset, requested, available):
@@ -63,7 +143,18 @@ class UnexpectedError(Exception):
     def __str__(self):
         return f'expected {self.expected}, got {self.actual}'
 
-def pack(format, *args, **kwargs):
+def compile(format):
     if format[0] not in '<>=@!':
         format = '<' + format
-    return struct.pack(format, *args, **kwargs)
+    return struct.Struct(format)
+
+_STRUCTS = {}
+def _struct(format):
+    try:
+        return _STRUCTS[format]
+    except KeyError:
+        st = _STRUCTS[format] = compile(format)
+        return st
+
+def pack(format, *args, **kwargs):
+    return _struct(format).pack(*args, **kwargs)